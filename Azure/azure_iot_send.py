@@ -1,3 +1,4 @@
+import os
 import time
 import random
 import json
@@ -8,25 +9,59 @@ registration_id = "4p4h03etwy"
 symmetric_key = "MZfVRBR3sjtujB3uT4SnLgDV10ArlfY7U8BirdL9ZFA="
 
 provisioning_host = "global.azure-devices-provisioning.net"
-provisioning_client = ProvisioningDeviceClient.create_from_symmetric_key(
-    provisioning_host=provisioning_host,
-    registration_id=registration_id,
-    id_scope=id_scope,
-    symmetric_key=symmetric_key
-)
+# Not the backend's dps_cache.json (iot_client.ProvisioningCache), which has a different schema.
+PROVISIONING_CACHE_FILE = "azure_iot_send_dps_cache.json"
+PROVISIONING_CACHE_TTL = 7 * 24 * 3600
 
-registration_result = provisioning_client.register()
 
-if registration_result.status != "assigned":
-    raise RuntimeError("Could not register device. Status: {}".format(registration_result.status))
+def provision():
+    provisioning_client = ProvisioningDeviceClient.create_from_symmetric_key(
+        provisioning_host=provisioning_host,
+        registration_id=registration_id,
+        id_scope=id_scope,
+        symmetric_key=symmetric_key
+    )
+    registration_result = provisioning_client.register()
+    if registration_result.status != "assigned":
+        raise RuntimeError("Could not register device. Status: {}".format(registration_result.status))
+    assigned_hub = registration_result.registration_state.assigned_hub
+    tmp = PROVISIONING_CACHE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"registration_id": registration_id, "assigned_hub": assigned_hub,
+                   "expires_at": time.time() + PROVISIONING_CACHE_TTL}, f)
+    os.replace(tmp, PROVISIONING_CACHE_FILE)
+    return assigned_hub
 
-device_client = IoTHubDeviceClient.create_from_symmetric_key(
-    symmetric_key=symmetric_key,
-    hostname=registration_result.registration_state.assigned_hub,
-    device_id=registration_id
-)
 
-device_client.connect()
+def cached_hub():
+    try:
+        with open(PROVISIONING_CACHE_FILE) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if entry.get("registration_id") != registration_id or entry.get("expires_at", 0) < time.time():
+        return None
+    return entry["assigned_hub"]
+
+
+def connect(hostname):
+    client = IoTHubDeviceClient.create_from_symmetric_key(
+        symmetric_key=symmetric_key,
+        hostname=hostname,
+        device_id=registration_id
+    )
+    client.connect()
+    return client
+
+
+# Only go back to DPS when there is no fresh cached assignment or it stops working.
+hostname = cached_hub()
+try:
+    device_client = connect(hostname or provision())
+except Exception:
+    if hostname is None:
+        raise
+    device_client = connect(provision())
 
 try:
     while True:
@@ -4,12 +4,13 @@ from gpiozero.pins.pigpio import PiGPIOFactory
 Device.pin_factory = PiGPIOFactory()
 
 import time
+import json
+from concurrent.futures import ThreadPoolExecutor
 import board
 import adafruit_dht
 from gpiozero import MotionSensor, Button
 from azure.iot.device import IoTHubDeviceClient, Message
-import cv2
-import base64
+from snapshots import Snapshotter, SnapshotPolicy, IoTHubBlobStore, LocalBlobStore, snapshot_blob_name
 
 # Replace with your Azure IoT Hub device connection string
 CONNECTION_STRING = "HostName=edgeAI-hub.azure-devices.net;DeviceId=edge-voice-test-device;SharedAccessKey=YOUR_KEY_HERE"
@@ -36,26 +37,26 @@ motion_sensor = MotionSensor(17)
 # ---------------------------
 # 4. USB Webcam (via OpenCV)
 # ---------------------------
-def get_camera_image():
-    """Capture one frame from the USB webcam, resize, encode as JPEG and return a base64 string."""
-    cap = cv2.VideoCapture(0)  # Open default camera
-    ret, frame = cap.read()
-    cap.release()
-    if not ret:
-        print("Failed to capture image")
-        return None
-    # Optionally resize (e.g., 320x240) to reduce message size
-    frame = cv2.resize(frame, (320, 240))
-    ret, buffer = cv2.imencode('.jpg', frame)
-    if not ret:
-        print("Failed to encode image")
-        return None
-    return base64.b64encode(buffer).decode('utf-8')
+# Snapshots are uploaded as JPEG blobs on motion or every SNAPSHOT_INTERVAL seconds;
+# telemetry only carries the blob reference. Capture and upload run on a worker
+# thread, so the reference rides on the first message after the upload finishes.
+DEVICE_ID = "edge-voice-test-device"
+SNAPSHOT_WIDTH = 320
+SNAPSHOT_HEIGHT = 240
+SNAPSHOT_QUALITY = 70
+SNAPSHOT_INTERVAL = 900
+# Set to a directory to keep snapshots locally instead of using IoT Hub file upload.
+SNAPSHOT_LOCAL_DIR = None
+
+snapshotter = Snapshotter(width=SNAPSHOT_WIDTH, height=SNAPSHOT_HEIGHT, quality=SNAPSHOT_QUALITY)
+snapshot_policy = SnapshotPolicy(interval=SNAPSHOT_INTERVAL)
+snapshot_executor = ThreadPoolExecutor(max_workers=1)
 
 # ---------------------------
 # Azure IoT Hub Client Initialization
 # ---------------------------
 client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
+blob_store = LocalBlobStore(SNAPSHOT_LOCAL_DIR) if SNAPSHOT_LOCAL_DIR else IoTHubBlobStore(client)
 
 def get_sensor_data():
     data = {}
@@ -88,27 +89,43 @@ def get_sensor_data():
         print("Motion sensor error:", e)
         data['motion'] = None
 
-    # USB Webcam: Capture snapshot
+    return data
+
+def take_snapshot():
+    """Capture and upload a snapshot; returns the blob reference or None."""
     try:
-        camera_image = get_camera_image()
-        data['camera_image'] = camera_image
+        image = snapshotter.capture()
+        if image is None:
+            print("Failed to capture image")
+            return None
+        return blob_store.upload(snapshot_blob_name(DEVICE_ID), image)
     except Exception as e:
-        print("Camera error:", e)
-        data['camera_image'] = None
-
-    return data
+        print("Snapshot upload error:", e)
+        return None
 
 def send_data_to_azure(data):
     try:
-        message = Message(str(data))
+        message = Message(json.dumps(data))
+        message.content_type = "application/json"
+        message.content_encoding = "utf-8"
         client.send_message(message)
         print("Data sent to Azure IoT Hub:", data)
     except Exception as e:
         print("Error sending data to Azure IoT Hub:", e)
 
 def main():
+    pending_snapshot = None
     while True:
         sensor_data = get_sensor_data()
+        if pending_snapshot is not None and pending_snapshot.done():
+            snapshot_ref = pending_snapshot.result()
+            pending_snapshot = None
+            if snapshot_ref:
+                sensor_data['snapshot'] = snapshot_ref
+        # due() tracks the motion edge, so it is checked even while an upload is in flight.
+        if snapshot_policy.due(sensor_data.get('motion')) and pending_snapshot is None:
+            snapshot_policy.mark()
+            pending_snapshot = snapshot_executor.submit(take_snapshot)
         send_data_to_azure(sensor_data)
         time.sleep(10)  # Wait 10 seconds between readings
 
@@ -0,0 +1,109 @@
+"""
+Camera snapshots sent as binary blobs instead of base64 inside telemetry.
+
+A snapshot is captured only on a motion event or on a slow cadence, encoded
+as raw JPEG bytes and uploaded through the IoT Hub file-upload path (or a
+local directory stand-in). Telemetry then carries just the blob reference.
+"""
+import os
+import time
+
+import cv2
+
+
+class Snapshotter:
+    """
+    Opens the webcam for each snapshot and encodes one frame as JPEG bytes.
+    The device is released straight after, so it is not held between
+    snapshots; the first `warmup` frames are dropped while exposure settles.
+    """
+
+    def __init__(self, device: int = 0, width: int = 320, height: int = 240, quality: int = 70,
+                 warmup: int = 5) -> None:
+        self.device = device
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.warmup = warmup
+
+    def capture(self):
+        cap = cv2.VideoCapture(self.device)
+        try:
+            if not cap.isOpened():
+                return None
+            for _ in range(self.warmup):
+                cap.grab()
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+        if not ret:
+            return None
+        frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+        return buffer.tobytes()
+
+
+class SnapshotPolicy:
+    """Due on a motion rising edge (rate-limited) or every `interval` seconds."""
+
+    def __init__(self, interval: float = 900.0, min_gap: float = 30.0) -> None:
+        self.interval = interval
+        self.min_gap = min_gap
+        self._last_shot = None
+        self._last_motion = False
+
+    def due(self, motion: bool, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        rising = bool(motion) and not self._last_motion
+        self._last_motion = bool(motion)
+        if self._last_shot is None:
+            return True
+        elapsed = now - self._last_shot
+        return elapsed >= self.interval or (rising and elapsed >= self.min_gap)
+
+    def mark(self, now: float = None) -> None:
+        self._last_shot = time.time() if now is None else now
+
+
+class IoTHubBlobStore:
+    """Uploads through the IoT Hub file-upload flow into the linked storage account."""
+
+    def __init__(self, client) -> None:
+        self.client = client
+
+    def upload(self, name: str, data: bytes) -> str:
+        from azure.storage.blob import BlobClient, ContentSettings
+
+        info = self.client.get_storage_info_for_blob(name)
+        url = "https://{}/{}/{}".format(info["hostName"], info["containerName"], info["blobName"])
+        try:
+            BlobClient.from_blob_url(url + info["sasToken"]).upload_blob(
+                data, overwrite=True, content_settings=ContentSettings(content_type="image/jpeg")
+            )
+        except Exception as e:
+            self.client.notify_blob_upload_status(info["correlationId"], False, 500, str(e))
+            raise
+        self.client.notify_blob_upload_status(info["correlationId"], True, 200, "OK")
+        return url
+
+
+class LocalBlobStore:
+    """Stand-in for the file-upload path that writes blobs to a local directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return "file://" + os.path.abspath(path)
+
+
+def snapshot_blob_name(device_id: str, now: float = None) -> str:
+    now = time.time() if now is None else now
+    return time.strftime(f"{device_id}/%Y/%m/%d/%H%M%S.jpg", time.gmtime(now))
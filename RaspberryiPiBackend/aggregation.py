@@ -0,0 +1,186 @@
+"""
+On-device windowed aggregation and report-by-exception.
+
+Numeric channels are folded into running min/max/sum/count per window, so
+each reading costs O(1) regardless of window length. Boolean and string
+channels produce an event only when their value changes. At window close a
+numeric channel is reported only if it moved outside its deadband since the
+last report, with a periodic heartbeat so silence still means "alive".
+"""
+import math
+
+DEFAULT_DEADBANDS = {
+    "Temperature": 0.2,
+    "Humidity": 1.0,
+    "ACTemperature": 0,
+    "FanSpeed": 0,
+}
+
+
+class _Channel:
+    __slots__ = ("min", "max", "sum", "count")
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+
+    def summary(self) -> dict:
+        return {
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.sum / self.count, 3),
+            "count": self.count,
+        }
+
+
+class WindowAggregator:
+    """
+    Feed readings with add(); it returns a list of records to send upstream
+    (state-change events immediately, a window summary when a window closes).
+    """
+
+    def __init__(self, window_seconds: float = 300.0, deadbands: dict = None,
+                 heartbeat_windows: int = 12, time_key: str = "Timestamp") -> None:
+        self.window_seconds = window_seconds
+        self.deadbands = DEFAULT_DEADBANDS if deadbands is None else deadbands
+        self.heartbeat_windows = heartbeat_windows
+        self.time_key = time_key
+        self._channels = {}
+        self._states = {}
+        self._reported = {}
+        self._window_start = None
+        self._silent_windows = 0
+
+    def _close_window(self, end: float) -> dict:
+        channels = {}
+        for name, channel in self._channels.items():
+            if channel.count == 0:
+                continue
+            summary = channel.summary()
+            last = self._reported.get(name)
+            band = self.deadbands.get(name, 0)
+            moved = (
+                last is None
+                or abs(summary["mean"] - last) > band
+                or summary["max"] - summary["min"] > band
+            )
+            if moved or self._silent_windows + 1 >= self.heartbeat_windows:
+                channels[name] = summary
+                self._reported[name] = summary["mean"]
+            channel.reset()
+        start = self._window_start
+        self._window_start = None
+        if not channels:
+            self._silent_windows += 1
+            return None
+        self._silent_windows = 0
+        return {"Type": "window", "WindowStart": start, "WindowEnd": end, "Channels": channels}
+
+    def add(self, reading: dict) -> list:
+        now = reading[self.time_key]
+        records = []
+        if self._window_start is not None and now - self._window_start >= self.window_seconds:
+            summary = self._close_window(self._window_start + self.window_seconds)
+            if summary:
+                records.append(summary)
+        if self._window_start is None:
+            # Align windows to wall-clock boundaries so summaries line up across devices.
+            self._window_start = now - (now % self.window_seconds)
+        for name, value in reading.items():
+            if name == self.time_key or value is None:
+                continue
+            if isinstance(value, (bool, str)):
+                if self._states.get(name) != value:
+                    self._states[name] = value
+                    records.append({"Type": "event", "Channel": name, "Value": value, "Timestamp": now})
+            elif isinstance(value, (int, float)):
+                channel = self._channels.get(name)
+                if channel is None:
+                    channel = self._channels[name] = _Channel()
+                channel.add(value)
+        return records
+
+    def flush(self, now: float) -> list:
+        """Close the open window early, e.g. on shutdown."""
+        if self._window_start is None:
+            return []
+        summary = self._close_window(now)
+        return [summary] if summary else []
+
+
+class HourlyResampler:
+    """
+    Incremental fixed-interval means (hourly by default) of a high-frequency
+    sensor stream. Feed every sample with add(timestamp, **values); a bucket
+    is returned once a sample from a later bucket arrives, as
+    {"start", "end", "values": {channel: mean}, "coverage": {channel: 0..1},
+    "filled": [channels], "gap_before": buckets}.
+
+    Samples with a None value still advance time. A channel with no samples
+    in a bucket is carried forward from its previous bucket and listed in
+    "filled". Whole buckets with no samples are forward-filled the same way
+    if there are at most `max_fill` of them. A longer outage is not
+    fabricated: those buckets are skipped and the next bucket reports the
+    gap in "gap_before", so the consumer can restart its history.
+    """
+
+    def __init__(self, channels=("temperature", "humidity"), bucket_seconds: float = 3600.0,
+                 sample_interval: float = 10.0, max_fill: int = 2) -> None:
+        self.channels = tuple(channels)
+        self.bucket_seconds = bucket_seconds
+        self.expected = max(1.0, bucket_seconds / sample_interval)
+        self.max_fill = max_fill
+        self._sums = {name: _Channel() for name in self.channels}
+        self._bucket = None
+        self._last = {}
+        self._gap_before = 0
+
+    def _close(self, bucket: int, gap_before: int = 0) -> dict:
+        values, coverage, filled = {}, {}, []
+        for name, channel in self._sums.items():
+            coverage[name] = round(min(1.0, channel.count / self.expected), 3)
+            if channel.count:
+                values[name] = channel.sum / channel.count
+                self._last[name] = values[name]
+            else:
+                values[name] = self._last.get(name)
+                filled.append(name)
+            channel.reset()
+        start = bucket * self.bucket_seconds
+        return {"start": start, "end": start + self.bucket_seconds, "values": values,
+                "coverage": coverage, "filled": filled, "gap_before": gap_before}
+
+    def add(self, timestamp: float, **values) -> list:
+        bucket = int(timestamp // self.bucket_seconds)
+        closed = []
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket < self._bucket:
+            return closed  # clock stepped back; drop the sample
+        elif bucket > self._bucket:
+            closed.append(self._close(self._bucket, self._gap_before))
+            self._gap_before = 0
+            missing = bucket - self._bucket - 1
+            if missing <= self.max_fill:
+                closed.extend(self._close(b) for b in range(self._bucket + 1, bucket))
+            else:
+                self._gap_before = missing
+                self._last.clear()
+            self._bucket = bucket
+        for name, value in values.items():
+            if value is not None and name in self._sums:
+                self._sums[name].add(float(value))
+        return closed
@@ -3,21 +3,21 @@ import threading
 import time
 import datetime
 import board
-import adafruit_dht
 import adafruit_ssd1306
 import busio
 import json
+from collections import deque
 import cv2
 import base64
 import pigpio
 import speech_recognition as sr
 import azure.cognitiveservices.speech as speechsdk
-import sys, logging, structlog
+import logging, structlog
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import numpy as np
 import smtplib
 from email.message import EmailMessage
@@ -25,11 +25,19 @@ from uuid import uuid4
 from apscheduler.schedulers.background import BackgroundScheduler
 import pandas as pd
 import os
-from tensorflow.keras.callbacks import EarlyStopping
-from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv1D, Dropout, Flatten, Dense, Reshape
-import tensorflow as tf
+from dht22 import DHT22Reader
+from telemetry import TelemetryBatcher, BATCH_CONTENT_TYPE, BATCH_CONTENT_ENCODING
+from spool import DiskQueue
+from iot_client import connect_device, run_forwarder
+from aggregation import WindowAggregator, HourlyResampler
+from commands import CommandRouter
+from logstore import LogWriter
+from voice_search import VoiceSearchIndex
+from logging_setup import configure_logging
+from model_registry import ModelRegistry
+from retraining import RetrainJob
+from forecasting import HourlyHistory, Forecaster, ForecastModel, MAX_HORIZON, rollout
+from tree_export import TreeEnsemble
 
 
 # ---------------------------
@@ -69,15 +77,16 @@ TEMPERATURE_LOG_CSV = "temperature_log.csv"
 RETRAIN_MODEL_H5 = "prediction_model_temp.h5"
 RETRAIN_MODEL_TFLITE = "temperature_model_new2.tflite"
 
-def log_hourly_temperature():
-    temp = latest_data.get("temperature")
+def log_hourly_temperature(bucket: dict):
+    """Append the mean temperature of a closed hourly bucket to the training log."""
+    temp = bucket["values"].get("temperature")
     if temp is None:
         return
 
-    now = datetime.datetime.now()
+    start = datetime.datetime.fromtimestamp(bucket["start"])
     df = pd.DataFrame([{
-        "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
-        "temperature_celsius": temp
+        "timestamp": start.strftime("%Y-%m-%d %H:%M:%S"),
+        "temperature_celsius": round(temp, 3)
     }])
 
     write_header = not os.path.exists(TEMPERATURE_LOG_CSV)
@@ -87,63 +96,14 @@ def log_hourly_temperature():
         header=write_header,
         index=False
     )
-    logger.info("Logged hourly temperature", timestamp=now, temp=temp)
+    logger.info("Logged hourly temperature", timestamp=start, temp=temp,
+                coverage=bucket["coverage"].get("temperature"))
 
-def retrain_model_daily():
-    if not os.path.exists(TEMPERATURE_LOG_CSV):
-        logger.warning("No temperature log found; skipping retrain.")
-        return
-
-    df = pd.read_csv(TEMPERATURE_LOG_CSV, parse_dates=["timestamp"])
-    temps = df["temperature_celsius"].values.reshape(-1, 1)
-
-    scaler = MinMaxScaler()
-    scaled = scaler.fit_transform(temps)
-
-    LOOKBACK, FORWARD = 5, 5
-    X, y = [], []
-    for i in range(len(scaled) - LOOKBACK - FORWARD + 1):
-        X.append(scaled[i : i + LOOKBACK])
-        y.append(scaled[i + LOOKBACK : i + LOOKBACK + FORWARD])
-    X = np.array(X)
-    y = np.array(y).reshape(-1, FORWARD, 1)
-
-    split = int(0.8 * len(X))
-    X_train, X_val = X[:split], X[split:]
-    y_train, y_val = y[:split], y[split:]
-
-    model = Sequential([
-        Conv1D(32, kernel_size=2, activation="relu", input_shape=(LOOKBACK, 1)),
-        Dropout(0.2),
-        Flatten(),
-        Dense(64, activation="relu"),
-        Dense(FORWARD),
-        Reshape((FORWARD, 1))
-    ])
-    model.compile(optimizer="adam", loss="mse", metrics=["mae"])
-    es = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
-    model.fit(
-        X_train, y_train,
-        validation_data=(X_val, y_val),
-        epochs=50,
-        batch_size=32,
-        callbacks=[es],
-        verbose=0
-    )
+# Training runs in a nice'd, CPU-pinned child process; TensorFlow never loads in this one.
+retrain_job = RetrainJob(TEMPERATURE_LOG_CSV, RETRAIN_MODEL_TFLITE, RETRAIN_MODEL_H5, timeout=2 * 3600)
 
-    os.makedirs(os.path.dirname(RETRAIN_MODEL_H5), exist_ok=True)
-    model.save(RETRAIN_MODEL_H5)
-    logger.info("Saved retrained Keras model", path=RETRAIN_MODEL_H5)
-
-    converter = tf.lite.TFLiteConverter.from_keras_model(model)
-    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
-    tflite_model = converter.convert()
-    with open(RETRAIN_MODEL_TFLITE, "wb") as f:
-        f.write(tflite_model)
-    logger.info("Saved retrained TFLite model", path=RETRAIN_MODEL_TFLITE)
-
-scheduler.add_job(log_hourly_temperature, 'cron', minute=0, id='hourly_temp_log')
+def retrain_model_daily():
+    retrain_job.run()
 
 scheduler.add_job(retrain_model_daily, 'cron', hour=0, minute=0, id='daily_model_retrain')
 
@@ -238,23 +198,14 @@ class ScheduleRequest(BaseModel):
     ac_temp: int
     fan_speed: int
 
+class BatchPredictionRequest(BaseModel):
+    histories: dict[str, list[float]]  # sensor id -> hourly temperatures (Celsius), oldest first
+    horizon: int = Field(5, ge=1, le=MAX_HORIZON)
+
 # ---------------------------
 # Logging Configuration
 # ---------------------------
-logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
-structlog.configure(
-    processors=[
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.stdlib.add_log_level,
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.dev.ConsoleRenderer(),
-    ],
-    context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
-)
+configure_logging()
 logger = structlog.get_logger()
 
 # ---------------------------
@@ -317,10 +268,11 @@ def list_schedules():
 # ---------------------------
 # Sensor & Light Control Initialization
 # ---------------------------
-dhtDevice = adafruit_dht.DHT22(board.D27)
 pi = pigpio.pi()
 if not pi.connected:
     raise SystemExit("Could not connect to pigpio daemon. Start it with 'sudo systemctl start pigpiod'.")
+DHT_SENSOR_PIN = 27
+dht_reader = DHT22Reader(pi, DHT_SENSOR_PIN)
 AIR_QUALITY_PIN = 18
 MOTION_SENSOR_PIN = 17
 pi.set_mode(AIR_QUALITY_PIN, pigpio.INPUT)
@@ -433,48 +385,107 @@ def detect_person():
 # ---------------------------
 # Log Persistence
 # ---------------------------
-systemLogs = []
-voiceLogs = []
+SYSTEM_LOG_FILE = "system_logs.txt"
+VOICE_LOG_FILE = "voice_logs.txt"
+systemLogs = deque(maxlen=200)
+voiceLogs = deque(maxlen=200)
+# Active files rotate daily or at 4 MB into gzip segments; archives are kept 180 days / 256 MB per log.
+LOG_ARCHIVE_DIR = "log_archive"
+system_log_writer = LogWriter(SYSTEM_LOG_FILE, archive_dir=LOG_ARCHIVE_DIR)
+# Voice entries are indexed for /voicelogs/search as each batch is flushed.
+voice_search = VoiceSearchIndex()
+# Backfill bounds are taken before the listener is attached; once it is, MAX(ts) may already be a new entry.
+voice_index_cutoff = time.time()
+voice_backfill_after = voice_search.latest_timestamp()
+voice_log_writer = LogWriter(VOICE_LOG_FILE, archive_dir=LOG_ARCHIVE_DIR, listeners=[voice_search.add_batch])
+
+def backfill_voice_search():
+    """Index voice entries logged before this process started that the index has not seen."""
+    try:
+        count = voice_search.backfill(
+            voice_log_writer.iter_pages(after=voice_backfill_after, before=voice_index_cutoff)
+        )
+    except Exception as e:
+        logger.error("Voice search backfill failed", error=str(e))
+        return
+    if count:
+        logger.info("Backfilled voice search index", entries=count)
+
+threading.Thread(target=backfill_voice_search, daemon=True).start()
 
 def log_system(message: str):
     log_entry = {"timestamp": time.time(), "message": message}
     systemLogs.append(log_entry)
-    if len(systemLogs) > 200:
-        systemLogs.pop(0)
-    with open("system_logs.txt", "a") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    system_log_writer.write(log_entry)
 
 def log_voice(user: str, assistant: str):
     log_entry = {"timestamp": time.time(), "user": user, "assistant": assistant}
     voiceLogs.append(log_entry)
-    if len(voiceLogs) > 200:
-        voiceLogs.pop(0)
-    with open("voice_logs.txt", "a") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    voice_log_writer.write(log_entry)
+
+@app.on_event("shutdown")
+def flush_logs():
+    system_log_writer.close()
+    voice_log_writer.close()
+
+def _log_window_bounds(after, before, start, end):
+    # start/end are an inclusive wall-clock range; after/before are exclusive epoch cursors.
+    if start is not None:
+        bound = start.timestamp() - 1e-6
+        after = bound if after is None else max(after, bound)
+    if end is not None:
+        bound = end.timestamp() + 1e-6
+        before = bound if before is None else min(before, bound)
+    return after, before
+
+def stream_log_window(writer: LogWriter, after, before, limit):
+    """Stream a JSON array of at most `limit` log entries, seeking via the sparse index."""
+    lines = writer.read_window(after=after, before=before, limit=limit)
+
+    def generate():
+        yield b"["
+        for i, line in enumerate(lines):
+            yield line if i == 0 else b"," + line
+        yield b"]"
+    return StreamingResponse(generate(), media_type="application/json")
 
 @app.get("/logs")
-def get_logs():
-    all_logs = []
-    try:
-        with open("system_logs.txt", "r") as f:
-            for line in f:
-                if line.strip():
-                    all_logs.append(json.loads(line))
-    except FileNotFoundError:
-        all_logs = systemLogs
-    return all_logs
+def get_logs(
+    limit: int = Query(200, ge=1, le=5000, description="Maximum number of entries"),
+    after: float = Query(None, description="Only entries newer than this epoch time (pages forward)"),
+    before: float = Query(None, description="Only entries older than this epoch time (pages backward)"),
+    start: datetime.datetime = Query(None, description="Start of time range (inclusive)"),
+    end: datetime.datetime = Query(None, description="End of time range (inclusive)"),
+):
+    after, before = _log_window_bounds(after, before, start, end)
+    return stream_log_window(system_log_writer, after, before, limit)
 
 @app.get("/voicelogs")
-def get_voice_logs():
-    all_logs = []
-    try:
-        with open("voice_logs.txt", "r") as f:
-            for line in f:
-                if line.strip():
-                    all_logs.append(json.loads(line))
-    except FileNotFoundError:
-        all_logs = voiceLogs
-    return all_logs
+def get_voice_logs(
+    limit: int = Query(200, ge=1, le=5000, description="Maximum number of entries"),
+    after: float = Query(None, description="Only entries newer than this epoch time (pages forward)"),
+    before: float = Query(None, description="Only entries older than this epoch time (pages backward)"),
+    start: datetime.datetime = Query(None, description="Start of time range (inclusive)"),
+    end: datetime.datetime = Query(None, description="End of time range (inclusive)"),
+):
+    after, before = _log_window_bounds(after, before, start, end)
+    return stream_log_window(voice_log_writer, after, before, limit)
+
+@app.get("/voicelogs/search")
+def search_voice_logs(
+    q: str = Query(..., min_length=1, description="Words to find in the user or assistant text"),
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    after: float = Query(None, description="Only entries newer than this epoch time"),
+    before: float = Query(None, description="Only entries older than this epoch time"),
+    start: datetime.datetime = Query(None, description="Start of time range (inclusive)"),
+    end: datetime.datetime = Query(None, description="End of time range (inclusive)"),
+):
+    """
+    Full-text search over voice interactions, newest first.
+    """
+    after, before = _log_window_bounds(after, before, start, end)
+    return {"results": voice_search.search(q, after=after, before=before, limit=limit, offset=offset)}
 
 @app.get("/lights")
 def get_light_states():
@@ -492,25 +503,15 @@ def get_light_states():
 def read_sensors():
     data = {}
     try:
-        temp = dhtDevice.temperature
-        hum = dhtDevice.humidity
-        if temp is not None and hum is not None:
-            data['temperature'] = temp
-            data['humidity'] = hum
-        else:
-            logger.warning("DHT22 read returned None; ignoring this cycle.")
-            data['temperature'] = None
-            data['humidity'] = None
+        temp, hum = dht_reader.read()
+        if temp is None:
+            logger.warning("DHT22 has no recent good sample; ignoring this cycle.")
+        data['temperature'] = temp
+        data['humidity'] = hum
     except Exception as e:
-        err_str = str(e).lower()
-        if "a full buffer was not returned" in err_str:
-            logger.warning("DHT22: A full buffer was not returned. Skipping this cycle.")
-            data['temperature'] = None
-            data['humidity'] = None
-        else:
-            logger.error("DHT22 error", error=str(e))
-            data['temperature'] = None
-            data['humidity'] = None
+        logger.error("DHT22 error", error=str(e))
+        data['temperature'] = None
+        data['humidity'] = None
     try:
         aq_val = pi.read(AIR_QUALITY_PIN)
         data['air_quality'] = "Poor" if aq_val == 1 else "Good"
@@ -527,10 +528,20 @@ def read_sensors():
     return data
 
 latest_data = {}
+# Hourly means of the 10 s stream feed the forecast history and the training log.
+hourly_resampler = HourlyResampler(("temperature", "humidity"), bucket_seconds=3600, sample_interval=10)
+
 def sensor_updater():
     global latest_data
     while True:
         latest_data = read_sensors()
+        try:
+            for bucket in hourly_resampler.add(latest_data["timestamp"],
+                                               temperature=latest_data.get("temperature"),
+                                               humidity=latest_data.get("humidity")):
+                hourly_bucket_closed(bucket)
+        except Exception as e:
+            logger.error("Hourly aggregation error", error=str(e))
         time.sleep(10)
 threading.Thread(target=sensor_updater, daemon=True).start()
 
@@ -566,56 +577,83 @@ def video_feed():
 # Light Control Endpoints
 # ---------------------------
 def set_light_state(pin: int, state: str):
-    logger.info(f"[DEBUG] Setting pin {pin} to state '{state}'")
     if state.lower() == "on":
         pi.write(pin, 1)
     elif state.lower() == "off":
         pi.write(pin, 0)
     else:
         raise ValueError("Invalid state; use 'on' or 'off'.")
-    logger.info(f"[DEBUG] Pin {pin} set to {'HIGH' if state.lower()=='on' else 'LOW'}")
+    logger.debug("Pin set", pin=pin, state=state)
+
+# Shared device-control logic used by the HTTP endpoints and IoT Hub direct methods.
+def apply_kitchen_light(state: str) -> dict:
+    global kitchen_state
+    set_light_state(KITCHEN_LIGHT_PIN, state)
+    kitchen_state = state.lower()
+    update_display()
+    log_system(f"Light turned {kitchen_state.upper()}")
+    return {"light": "kitchen", "state": kitchen_state}
+
+def apply_livingroom_ac(state: str) -> dict:
+    global livingroom_state, livingroom_ac_temp
+    set_light_state(LIVINGROOM_AC_PIN, state)
+    if state.lower() == "on":
+        livingroom_state = "on"
+        livingroom_ac_temp = 16
+    else:
+        livingroom_state = "off"
+    update_display()
+    log_system(f"AC turned {livingroom_state.upper()}")
+    return {"light": "livingroom_ac", "state": livingroom_state, "ac_temp": livingroom_ac_temp}
+
+def apply_bedroom_fan(state: str) -> dict:
+    global bedroom_state, bedroom_fan_speed
+    set_light_state(BEDROOM_FAN_PIN, state)
+    if state.lower() == "on":
+        bedroom_state = "on"
+        bedroom_fan_speed = 1
+    else:
+        bedroom_state = "off"
+    update_display()
+    log_system(f"Fan turned {bedroom_state.upper()}")
+    return {"light": "bedroom_fan", "state": bedroom_state, "fan_speed": bedroom_fan_speed}
+
+def apply_ac_temp(value: int) -> dict:
+    global livingroom_ac_temp
+    if value < 16 or value > 32:
+        raise ValueError("AC temperature must be between 16 and 32")
+    livingroom_ac_temp = value
+    update_display()
+    log_system(f"AC temperature set to {value}C")
+    return {"ac_temp": value}
+
+def apply_fan_speed(level: int) -> dict:
+    global bedroom_fan_speed
+    if level < 1 or level > 3:
+        raise ValueError("Fan speed must be between 1 and 3")
+    bedroom_fan_speed = level
+    update_display()
+    log_system(f"Fan speed set to level {level}")
+    return {"fan_speed": level}
 
 @app.get("/light/kitchen")
 def control_kitchen_light(state: str = Query(..., description="Light state: 'on' or 'off'")):
-    global kitchen_state
     try:
-        set_light_state(KITCHEN_LIGHT_PIN, state)
-        kitchen_state = state.lower()
-        update_display()
-        log_system(f"Light turned {kitchen_state.upper()}")
-        return {"light": "kitchen", "state": kitchen_state}
+        return apply_kitchen_light(state)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/light/livingroom")
 def control_livingroom_ac(state: str = Query(..., description="Light state: 'on' or 'off'")):
-    global livingroom_state, livingroom_ac_temp
     try:
-        set_light_state(LIVINGROOM_AC_PIN, state)
-        if state.lower() == "on":
-            livingroom_state = "on"
-            livingroom_ac_temp = 16
-        else:
-            livingroom_state = "off"
-        update_display()
-        log_system(f"AC turned {livingroom_state.upper()}")
-        return {"light": "livingroom_ac", "state": livingroom_state, "ac_temp": livingroom_ac_temp}
+        return apply_livingroom_ac(state)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/light/bedroom")
 def control_bedroom_fan(state: str = Query(..., description="Light state: 'on' or 'off'")):
-    global bedroom_state, bedroom_fan_speed
     try:
-        set_light_state(BEDROOM_FAN_PIN, state)
-        if state.lower() == "on":
-            bedroom_state = "on"
-            bedroom_fan_speed = 1
-        else:
-            bedroom_state = "off"
-        update_display()
-        log_system(f"Fan turned {bedroom_state.upper()}")
-        return {"light": "bedroom_fan", "state": bedroom_state, "fan_speed": bedroom_fan_speed}
+        return apply_bedroom_fan(state)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -633,23 +671,17 @@ def login(request: LoginRequest):
 # ---------------------------
 @app.get("/ac/temp")
 def control_ac_temp(value: int = Query(..., description="AC temperature between 16 and 32")):
-    global livingroom_ac_temp
-    if value < 16 or value > 32:
-        raise HTTPException(status_code=400, detail="AC temperature must be between 16 and 32")
-    livingroom_ac_temp = value
-    update_display()
-    log_system(f"AC temperature set to {value}C")
-    return {"ac_temp": value}
+    try:
+        return apply_ac_temp(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/fan/speed")
 def control_fan_speed(level: int = Query(..., description="Fan speed level between 1 and 3")):
-    global bedroom_fan_speed
-    if level < 1 or level > 3:
-        raise HTTPException(status_code=400, detail="Fan speed must be between 1 and 3")
-    bedroom_fan_speed = level
-    update_display()
-    log_system(f"Fan speed set to level {level}")
-    return {"fan_speed": level}
+    try:
+        return apply_fan_speed(level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # ---------------------------
 # Temperature Prediction Module
@@ -657,76 +689,189 @@ def control_fan_speed(level: int = Query(..., description="Fan speed level betwe
 # Global variables for temperature prediction
 temperature_history = []
 latest_temperature_prediction = []
+latest_prediction_version = None
 
-def predict_temperature(model_path: str, input_temps: list) -> list:
+model_registry = ModelRegistry()
+model_registry.register("temperature", RETRAIN_MODEL_TFLITE)
+# Separate interpreter for /predict/batch: its batch shapes don't force the single-history
+# interpreter to re-allocate, and the two paths don't queue on one lock.
+model_registry.register("temperature_batch", RETRAIN_MODEL_TFLITE)
+MAX_BATCH_SENSORS = 256
+
+# Scaling of the legacy shipped model, which predates embedded metadata; models exported
+# by tflite_export.py carry their own range (and may have int8 I/O, handled by invoke()).
+DEFAULT_TEMPERATURE_SCALING = {"scale_min": 273.0, "scale_max": 293.1, "units": "kelvin"}
+
+def temperature_step(windows: np.ndarray, model_name: str = "temperature") -> np.ndarray:
     """
-    Predict the next 5 hours of temperature given the last 5 hourly readings (in Celsius).
-    Uses a TFLite model with built-in MinMax scaling.
+    One model invocation for a batch of 5-hour temperature windows (B, 5, 1) in Celsius;
+    returns the next 5 hours for each (B, 5, 1).
     """
-    interpreter = tflite.Interpreter(model_path=model_path)
-    interpreter.allocate_tensors()
-    
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    
-    scale_min = 273.0
-    scale_max = 293.1
-    
-    input_data = np.array(input_temps, dtype=np.float32)
-    input_kelvin = input_data + 273.15
-    input_scaled = (input_kelvin - scale_min) / (scale_max - scale_min)
-    input_reshaped = input_scaled.reshape(1, 5, 1).astype(np.float32)
-    
-    interpreter.set_tensor(input_details[0]['index'], input_reshaped)
-    interpreter.invoke()
-    
-    prediction_scaled = interpreter.get_tensor(output_details[0]['index'])
-    prediction_reshaped = prediction_scaled.reshape(-1)
-    prediction_kelvin = prediction_reshaped * (scale_max - scale_min) + scale_min
-    prediction_celsius = prediction_kelvin - 273.15
-    
-    return prediction_celsius.tolist()
+    model = model_registry.get(model_name)
+    scaling = model.metadata if "scale_min" in model.metadata else DEFAULT_TEMPERATURE_SCALING
+    scale_min = scaling["scale_min"]
+    scale_max = scaling["scale_max"]
+    offset = 273.15 if scaling.get("units") == "kelvin" else 0.0
+
+    input_scaled = (np.asarray(windows, dtype=np.float32) + offset - scale_min) / (scale_max - scale_min)
+    prediction_scaled = model.invoke(input_scaled.reshape(-1, 5, 1).astype(np.float32))
+    return prediction_scaled.reshape(-1, 5, 1) * (scale_max - scale_min) + scale_min - offset
+
+batch_temperature_model = ForecastModel(
+    "temperature_tflite", ("temperature",), lookback=5, steps=5,
+    step=lambda windows: temperature_step(windows, "temperature_batch"),
+    version=lambda: model_registry.get("temperature_batch").version,
+)
 
-def temperature_prediction_updater():
+def predict_temperature(input_temps: list) -> tuple:
     """
-    Every hour, update the temperature history (if less than 5 readings, fill with current value)
-    and run the TFLite model to predict the next five hours of temperature.
+    Predict the next 5 hours of temperature given the last 5 hourly readings (in Celsius).
+    Uses the cached TFLite interpreter from the model registry; returns (prediction, model_version).
     """
-    global temperature_history, latest_temperature_prediction, latest_data
-    while True:
-        current_temp = latest_data.get("temperature")
-        if current_temp is None:
-            if temperature_history and temperature_history[-1] is not None:
-                current_temp = temperature_history[-1]
-            else:
-                current_temp = 30.0
+    prediction = temperature_step(np.array(input_temps, dtype=np.float32).reshape(1, 5, 1))
+    return prediction.reshape(-1).tolist(), model_registry.get("temperature").version
+
+# Hourly history shared by /temperature_prediction and /forecast.
+sensor_history = HourlyHistory(("temperature", "humidity"))
+forecaster = Forecaster(sensor_history)
+forecaster.add_model(ForecastModel(
+    "temperature_tflite", ("temperature",), lookback=5, steps=5, step=temperature_step,
+    version=lambda: model_registry.get("temperature").version,
+))
+
+# Multivariate XGBoost forecaster from temps.ipynb, exported by tree_export.py; it is the
+# humidity model (temperature stays on the TFLite model registered above).
+XGB_FORECAST_NPZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models",
+                                "mendalay_forecast_5h_trees.npz")
+if os.path.exists(XGB_FORECAST_NPZ):
+    xgb_forecaster = TreeEnsemble(XGB_FORECAST_NPZ)
+    forecaster.add_model(ForecastModel(
+        "mendalay_xgb", ("temperature", "humidity"), lookback=xgb_forecaster.n_past,
+        steps=xgb_forecaster.n_future, step=xgb_forecaster.step, version=lambda: xgb_forecaster.version,
+    ))
+else:
+    logger.warning("Packed XGBoost forecaster not found; humidity forecasts disabled", path=XGB_FORECAST_NPZ)
+
+def update_temperature_prediction():
+    global temperature_history, latest_temperature_prediction, latest_prediction_version
+    temperature_history = sensor_history.latest("temperature", 5)
+    if not temperature_history:
+        return
+    temperature_history = [temperature_history[0]] * (5 - len(temperature_history)) + temperature_history
+    try:
+        result = forecaster.forecast(["temperature"], 5)["channels"]["temperature"]
+        latest_temperature_prediction = result["forecast"]
+        latest_prediction_version = result["model_version"]
+        logger.info("Temperature prediction updated", prediction=latest_temperature_prediction,
+                    model_version=latest_prediction_version)
+    except Exception as e:
+        logger.error("Temperature prediction error", error=str(e))
+        latest_temperature_prediction = []
 
-        if len(temperature_history) < 5:
-            temperature_history = [current_temp] * 5
-        else:
-            temperature_history.pop(0)
-            temperature_history.append(current_temp)
+def hourly_bucket_closed(bucket: dict):
+    """
+    Called from the sensor thread when an hourly bucket closes: extend the
+    forecast history with its means and refresh the prediction. After an
+    outage longer than the resampler will fill, the stale history is dropped.
+    """
+    if bucket["gap_before"]:
+        logger.warning("Sensor gap; restarting hourly history", missing_hours=bucket["gap_before"])
+        sensor_history.reset()
+    sensor_history.append(**bucket["values"])
+    log_hourly_temperature(bucket)
+    update_temperature_prediction()
+
+def seed_history_from_log(max_age_hours: int = 3):
+    """Reload the last hourly temperatures logged before a restart, if they are recent."""
+    if not os.path.exists(TEMPERATURE_LOG_CSV):
+        return
+    with open(TEMPERATURE_LOG_CSV, "rb") as f:
+        f.seek(max(0, os.path.getsize(TEMPERATURE_LOG_CSV) - 4096))
+        lines = f.read().decode("utf-8", errors="replace").splitlines()[1:]
+    rows = []
+    for line in lines[-5:]:
         try:
-            latest_temperature_prediction = predict_temperature("temperature_model_new2.tflite", temperature_history)
-            logger.info("Temperature prediction updated", prediction=latest_temperature_prediction)
-        except Exception as e:
-            logger.error("Temperature prediction error", error=str(e))
-            latest_temperature_prediction = []
-        time.sleep(3600)
-
+            stamp, temp = line.split(",")[:2]
+            rows.append((datetime.datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S"), float(temp)))
+        except ValueError:
+            continue
+    if not rows or datetime.datetime.now() - rows[-1][0] > datetime.timedelta(hours=max_age_hours + 1):
+        return
+    for _, temp in rows:
+        sensor_history.append(temperature=temp)
+    update_temperature_prediction()
 
-threading.Thread(target=temperature_prediction_updater, daemon=True).start()
+seed_history_from_log()
 
 @app.get("/temperature_prediction")
 def get_temperature_prediction():
     """
-    Returns the last 5 hourly temperature history and predicted next 5 hours temperatures.
+    Returns the last 5 hourly mean temperatures and the predicted next 5 hours.
     """
     return {
         "temperature_history": temperature_history,
-        "temperature_prediction": latest_temperature_prediction
+        "temperature_prediction": latest_temperature_prediction,
+        "model_version": latest_prediction_version
+    }
+
+@app.get("/forecast")
+def get_forecast(
+    horizon: int = Query(5, ge=1, le=MAX_HORIZON, description="Hours ahead"),
+    channels: str = Query("temperature", description="Comma-separated, e.g. temperature,humidity"),
+):
+    """
+    Forecast the next `horizon` hours for each channel by recursive rollout of the
+    channel's model. Results are cached per history version, so any horizon up to
+    the longest one already computed is served without inference.
+    """
+    names = [name.strip() for name in channels.split(",") if name.strip()]
+    try:
+        return forecaster.forecast(names, horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/predict/batch")
+def predict_batch(req: BatchPredictionRequest):
+    """
+    Temperature forecasts for many sensors in one pass. The histories are stacked
+    into a single (B, 5, 1) tensor, so every 5-hour block of the horizon is one
+    invoke for the whole batch. Histories shorter than 5 hours are back-filled
+    with their oldest value, as for /forecast.
+    """
+    if not req.histories:
+        raise HTTPException(status_code=400, detail="No histories given")
+    if len(req.histories) > MAX_BATCH_SENSORS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SENSORS} sensors per request")
+    sensor_ids = list(req.histories)
+    windows = np.empty((len(sensor_ids), 5, 1), dtype=np.float32)
+    for i, sensor_id in enumerate(sensor_ids):
+        values = req.histories[sensor_id][-5:]
+        if not values:
+            raise HTTPException(status_code=400, detail=f"Empty history for sensor '{sensor_id}'")
+        windows[i, :, 0] = [values[0]] * (5 - len(values)) + values
+    if not np.isfinite(windows).all():
+        raise HTTPException(status_code=400, detail="Histories must be finite numbers")
+
+    # Pad to a power of two so the interpreter only ever sees a handful of batch shapes.
+    size = 1 << (len(windows) - 1).bit_length()
+    padded = np.concatenate([windows, np.repeat(windows[-1:], size - len(windows), axis=0)])
+    try:
+        predictions = rollout(batch_temperature_model, padded, req.horizon)[:len(windows), :, 0]
+    except Exception as e:
+        logger.error("Batch prediction error", sensors=len(sensor_ids), error=str(e))
+        raise HTTPException(status_code=500, detail="Prediction failed")
+    return {
+        "horizon": req.horizon,
+        "model_version": batch_temperature_model.version(),
+        "forecasts": {sensor_id: [round(float(v), 2) for v in predictions[i]]
+                      for i, sensor_id in enumerate(sensor_ids)},
     }
 
+@app.get("/retrain/status")
+def get_retrain_status():
+    """Progress of the running retrain, or the outcome of the last one."""
+    return retrain_job.status
+
 # ---------------------------
 # GPT & Voice Assistant Components
 # ---------------------------
@@ -916,7 +1061,7 @@ speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, au
 def recognize_speech(timeout=8):
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
-        print("Listening...")
+        logger.debug("Listening for speech")
         recognizer.adjust_for_ambient_noise(source)
         try:
             audio = recognizer.listen(source, timeout=timeout)
@@ -928,12 +1073,10 @@ def recognize_speech(timeout=8):
             return None
 
 def speak_text(text: str):
-    print(f"Speaking: {text}")
+    logger.debug("Speaking", text=text)
     result = speech_synthesizer.speak_text_async(text).get()
-    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-        print("Speech synthesized successfully.")
-    else:
-        print("Speech synthesis error:", result.cancellation_details)
+    if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+        logger.error("Speech synthesis error", details=str(result.cancellation_details))
 
 async def voice_assistant_loop():
     """
@@ -1054,51 +1197,83 @@ threading.Thread(target=automation_controller, daemon=True).start()
 # ---------------------------
 # Azure IoT Hub Telemetry Sender
 # ---------------------------
-from azure.iot.device import ProvisioningDeviceClient, IoTHubDeviceClient, Message
+from azure.iot.device import Message
+
+TELEMETRY_SPOOL_DIR = "telemetry_spool"
+telemetry_spool = DiskQueue(TELEMETRY_SPOOL_DIR)
+
+IOT_ID_SCOPE = "0ne00E9E05C"
+IOT_REGISTRATION_ID = "4p4h03etwy"
+IOT_SYMMETRIC_KEY = "MZfVRBR3sjtujB3uT4SnLgDV10ArlfY7U8BirdL9ZFA="
+
+# Direct methods route into the same control functions as /light/*, /ac/temp and /fan/speed.
+command_router = CommandRouter()
+command_router.add("setKitchenLight", lambda p: apply_kitchen_light(p["state"]))
+command_router.add("setLivingroomAc", lambda p: apply_livingroom_ac(p["state"]))
+command_router.add("setBedroomFan", lambda p: apply_bedroom_fan(p["state"]))
+command_router.add("setAcTemp", lambda p: apply_ac_temp(int(p["value"])))
+command_router.add("setFanSpeed", lambda p: apply_fan_speed(int(p["level"])))
+command_router.add("getState", lambda p: get_light_states())
+
+async def connect_iot_hub():
+    device_client = await connect_device(IOT_ID_SCOPE, IOT_REGISTRATION_ID, IOT_SYMMETRIC_KEY)
+    command_router.bind(device_client)
+    return device_client
+
+@app.get("/commands/stats")
+def get_command_stats():
+    """
+    Returns direct-method counts, on-device handling latency and cloud-to-device delivery latency.
+    """
+    return command_router.stats()
+
+def make_batch_message(payload: bytes) -> Message:
+    msg = Message(payload)
+    msg.content_type = BATCH_CONTENT_TYPE
+    msg.content_encoding = BATCH_CONTENT_ENCODING
+    return msg
+
+# Raw 5 s samples stay on the device (last hour); only aggregates go to the cloud.
+raw_telemetry = deque(maxlen=720)
 
 def iot_telemetry_sender():
-    id_scope = "0ne00E9E05C"
-    registration_id = "4p4h03etwy"
-    symmetric_key = "MZfVRBR3sjtujB3uT4SnLgDV10ArlfY7U8BirdL9ZFA="
-    provisioning_host = "global.azure-devices-provisioning.net"
-    provisioning_client = ProvisioningDeviceClient.create_from_symmetric_key(
-        provisioning_host=provisioning_host,
-        registration_id=registration_id,
-        id_scope=id_scope,
-        symmetric_key=symmetric_key
-    )
-    registration_result = provisioning_client.register()
-    if registration_result.status != "assigned":
-        raise RuntimeError("Could not register device. Status: {}".format(registration_result.status))
-    device_client = IoTHubDeviceClient.create_from_symmetric_key(
-        symmetric_key=symmetric_key,
-        hostname=registration_result.registration_state.assigned_hub,
-        device_id=registration_id
-    )
-    device_client.connect()
-    try:
-        while True:
-            telemetry = {
-                "Temperature": latest_data.get("temperature"),
-                "Humidity": latest_data.get("humidity"),
-                "AirQuality": latest_data.get("air_quality"),
-                "Motion": latest_data.get("motion"),
-                "ACTemperature": livingroom_ac_temp,
-                "FanSpeed": bedroom_fan_speed,
-                "Timestamp": time.time()
-            }
-            msg = Message(json.dumps(telemetry))
-            msg.content_type = "application/json"
-            msg.content_encoding = "utf-8"
-            print(f"Sending telemetry: {telemetry}")
-            device_client.send_message(msg)
-            time.sleep(5)
-    except KeyboardInterrupt:
-        print("Telemetry sender stopped by user.")
-    finally:
-        device_client.disconnect()
+    """
+    Sample every 5 s, aggregate into windows with report-by-exception and
+    spool each flushed batch to disk. Delivery is handled by the asyncio
+    forwarder, so an outage never loses readings.
+    """
+    aggregator = WindowAggregator()
+    batcher = TelemetryBatcher(thresholds={})
+    while True:
+        telemetry = {
+            "Temperature": latest_data.get("temperature"),
+            "Humidity": latest_data.get("humidity"),
+            "AirQuality": latest_data.get("air_quality"),
+            "Motion": latest_data.get("motion"),
+            "ACTemperature": livingroom_ac_temp,
+            "FanSpeed": bedroom_fan_speed,
+            "Timestamp": time.time()
+        }
+        raw_telemetry.append(telemetry)
+        for record in aggregator.add(telemetry):
+            if batcher.add(record, urgent=record["Type"] == "event"):
+                telemetry_spool.put(batcher.drain())
+        if batcher.due():
+            telemetry_spool.put(batcher.drain())
+        time.sleep(5)
+
+@app.get("/telemetry/raw")
+def get_raw_telemetry(limit: int = Query(720, ge=1, le=720)):
+    """
+    Returns the most recent raw 5-second telemetry samples kept on the device.
+    """
+    return list(raw_telemetry)[-limit:]
+
+def start_iot_telemetry_forwarder():
+    asyncio.run(run_forwarder(telemetry_spool, connect_iot_hub, make_batch_message))
 
 threading.Thread(target=iot_telemetry_sender, daemon=True).start()
+threading.Thread(target=start_iot_telemetry_forwarder, daemon=True).start()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,255 @@
+"""
+Rolling-origin backtest and latency benchmark for the forecasting models.
+
+The hourly Mendalay.csv series is split into `--folds` consecutive test
+blocks, each starting at a later forecast origin. Every model forecasts
+`--horizon` hours from each window in a block (recursive rollout past the
+model's native 5 steps), and errors are accumulated per horizon step. Folds
+run in parallel in a process pool; each worker loads its own models, so
+interpreters are never shared across processes. Single-window inference
+latency is sampled per model in every fold; for clean latency numbers run
+with --workers 1.
+
+Models: the Conv1D TFLite model (temperature), the pickled XGBoost
+MultiOutputRegressor from temps.ipynb and its packed-tree export
+(temperature + humidity), XGBoost refitted per fold, and a persistence
+baseline.
+
+The shipped XGBoost artifacts were trained in temps.ipynb on a shuffled 80%
+of the windows of this same file, so most test windows are in their
+training set. Their scores are marked "in_sample" in the report and are not
+a forecast-skill estimate. xgb_refit is the honest comparison: each fold
+fits a fresh model with the notebook's hyperparameters on the rows before
+the fold's first origin only.
+
+    python backtest.py --csv ../Mendalay.csv --out backtest_report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset import sliding_windows
+from forecasting import ForecastModel, rollout
+from ingest import load_series
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHANNELS = ("temperature", "humidity")
+# Scaling of the shipped Conv1D model (see DEFAULT_TEMPERATURE_SCALING in app.py).
+DEFAULT_TFLITE_SCALING = {"scale_min": 273.0, "scale_max": 293.1, "units": "kelvin"}
+LATENCY_SAMPLES = 200
+# XGBRegressor settings of build_forecasting_model() in temps.ipynb.
+XGB_NOTEBOOK_PARAMS = {"n_estimators": 100, "max_depth": 5, "learning_rate": 0.1}
+# Pre-trained on windows overlapping the test folds (see module docstring).
+IN_SAMPLE = {"xgb_pickle", "xgb_packed"}
+
+
+def tflite_model(path: str) -> ForecastModel:
+    import tflite_export
+
+    with open(path, "rb") as f:
+        content = f.read()
+    interpreter = tflite_export.interpreter(model_content=content)
+    scaling = tflite_export.read_json_metadata(content) or DEFAULT_TFLITE_SCALING
+    if os.path.exists(path + ".json"):
+        with open(path + ".json") as f:
+            stamp = json.load(f)
+        if "scale_min" in stamp:
+            scaling = stamp
+    low, high = scaling["scale_min"], scaling["scale_max"]
+    offset = 273.15 if scaling.get("units") == "kelvin" else 0.0
+
+    def step(windows):
+        output = tflite_export.run(interpreter, ((windows + offset - low) / (high - low)).astype(np.float32))
+        return output.reshape(len(windows), -1, 1) * (high - low) + low - offset
+
+    return ForecastModel("tflite_conv1d", ("temperature",), lookback=5, steps=5, step=step)
+
+
+def xgb_pickle_model(models_dir: str, prefix: str = "mendalay_forecast_5h") -> ForecastModel:
+    import pickle
+    from dataset import flatten_channels
+
+    def load(name):
+        with open(os.path.join(models_dir, f"{prefix}_{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    model, scaler_X, scaler_y, config = load("model"), load("scaler_X"), load("scaler_y"), load("config")
+    n_future = config["n_future"]
+
+    def step(windows):
+        y = scaler_y.inverse_transform(model.predict(scaler_X.transform(flatten_channels(windows))))
+        return y.reshape(len(windows), -1, n_future).transpose(0, 2, 1)
+
+    return ForecastModel("xgb_pickle", CHANNELS, lookback=config["n_past"], steps=n_future, step=step)
+
+
+def xgb_packed_model(npz_path: str) -> ForecastModel:
+    from tree_export import TreeEnsemble
+
+    ensemble = TreeEnsemble(npz_path)
+    return ForecastModel("xgb_packed", CHANNELS, lookback=ensemble.n_past, steps=ensemble.n_future,
+                         step=ensemble.step)
+
+
+def xgb_refit_model(train: np.ndarray, n_past: int = 5, n_future: int = 5) -> ForecastModel:
+    """XGBoost fitted on `train` (the rows before the fold) with the notebook's settings."""
+    from sklearn.multioutput import MultiOutputRegressor
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBRegressor
+    from dataset import flatten_channels
+
+    X, y = sliding_windows(np.asarray(train, dtype=np.float64), n_past, n_future)
+    X, y = flatten_channels(X), flatten_channels(y)
+    scaler_X, scaler_y = StandardScaler().fit(X), StandardScaler().fit(y)
+    # One thread per fold worker; the folds already run in parallel.
+    model = MultiOutputRegressor(XGBRegressor(n_jobs=1, **XGB_NOTEBOOK_PARAMS))
+    model.fit(scaler_X.transform(X), scaler_y.transform(y))
+
+    def step(windows):
+        y = scaler_y.inverse_transform(model.predict(scaler_X.transform(flatten_channels(windows))))
+        return y.reshape(len(windows), -1, n_future).transpose(0, 2, 1)
+
+    return ForecastModel("xgb_refit", CHANNELS, lookback=n_past, steps=n_future, step=step)
+
+
+def persistence_model(lookback: int = 5) -> ForecastModel:
+    step = lambda windows: np.repeat(windows[:, -1:, :], lookback, axis=1)
+    return ForecastModel("persistence", CHANNELS, lookback=lookback, steps=lookback, step=step)
+
+
+def build_models(specs: dict, train: np.ndarray) -> list:
+    """Models for one fold; `train` is the data before the fold, for models fitted here."""
+    builders = {
+        "tflite_conv1d": tflite_model,
+        "xgb_pickle": xgb_pickle_model,
+        "xgb_packed": xgb_packed_model,
+        "xgb_refit": lambda _: xgb_refit_model(train),
+        "persistence": lambda _: persistence_model(),
+    }
+    return [builders[name](arg) for name, arg in specs.items()]
+
+
+def evaluate_fold(task: tuple) -> dict:
+    """Worker: all models over one fold. Returns error sums so folds can be merged exactly."""
+    fold, series, start, stop, horizon, specs, batch_size = task
+    results = {}
+    for model in build_models(specs, series[:start]):
+        columns = [CHANNELS.index(name) for name in model.channels]
+        X, y = sliding_windows(series[:, columns], model.lookback, horizon)
+        # Forecast origins inside this fold; windows look back before `start` if needed.
+        origins = np.arange(max(start, model.lookback), min(stop, len(series) - horizon + 1))
+        index = origins - model.lookback
+        abs_sum = np.zeros((horizon, len(columns)))
+        sq_sum = np.zeros((horizon, len(columns)))
+        for begin in range(0, len(index), batch_size):
+            idx = index[begin:begin + batch_size]
+            predictions = rollout(model, np.asarray(X[idx], dtype=np.float32), horizon)
+            error = predictions - y[idx]
+            abs_sum += np.abs(error).sum(axis=0)
+            sq_sum += (error ** 2).sum(axis=0)
+
+        latencies = []
+        sample = index[np.linspace(0, len(index) - 1, min(LATENCY_SAMPLES, len(index))).astype(int)]
+        for i in sample:
+            window = np.asarray(X[i:i + 1], dtype=np.float32)
+            started = time.perf_counter()
+            model.step(window)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+        results[model.name] = {
+            "channels": list(model.channels),
+            "count": int(len(index)),
+            "abs_sum": abs_sum.tolist(),
+            "sq_sum": sq_sum.tolist(),
+            "latency_ms": latencies,
+        }
+    return {"fold": fold, "start": int(start), "stop": int(stop), "models": results}
+
+
+def merge(folds: list, horizon: int) -> dict:
+    report = {}
+    for name in folds[0]["models"]:
+        parts = [fold["models"][name] for fold in folds]
+        count = sum(p["count"] for p in parts)
+        abs_sum = sum(np.asarray(p["abs_sum"]) for p in parts)
+        sq_sum = sum(np.asarray(p["sq_sum"]) for p in parts)
+        latencies = np.concatenate([p["latency_ms"] for p in parts])
+        channels = parts[0]["channels"]
+        report[name] = {
+            "windows": count,
+            "in_sample": name in IN_SAMPLE,
+            "channels": {
+                channel: {
+                    "mae": np.round(abs_sum[:, c] / count, 4).tolist(),
+                    "rmse": np.round(np.sqrt(sq_sum[:, c] / count), 4).tolist(),
+                    "fold_mae": [round(float(np.mean(np.asarray(p["abs_sum"])[:, c]) / p["count"]), 4)
+                                 for p in parts],
+                }
+                for c, channel in enumerate(channels)
+            },
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)), 4),
+                "p95": round(float(np.percentile(latencies, 95)), 4),
+                "p99": round(float(np.percentile(latencies, 99)), 4),
+            },
+        }
+    return report
+
+
+def run(csv_path: str, specs: dict, folds: int = 5, horizon: int = 5, holdout: float = 0.5,
+        workers: int = None, batch_size: int = 256) -> dict:
+    series = load_series(csv_path, CHANNELS)
+    # Test blocks cover the last `holdout` fraction. Windows and refitted models only use rows
+    # before each origin; pre-trained artifacts may not (IN_SAMPLE).
+    first = int(len(series) * (1 - holdout))
+    edges = np.linspace(first, len(series), folds + 1).astype(int)
+    tasks = [(i, series, edges[i], edges[i + 1], horizon, specs, batch_size) for i in range(folds)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        fold_results = list(pool.map(evaluate_fold, tasks))
+    return {
+        "dataset": os.path.abspath(csv_path),
+        "rows": int(len(series)),
+        "folds": [{"fold": r["fold"], "start": r["start"], "stop": r["stop"]} for r in fold_results],
+        "horizon": horizon,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "models": merge(fold_results, horizon),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest forecasters on Mendalay.csv")
+    parser.add_argument("--csv", default=os.path.join(HERE, "..", "Mendalay.csv"))
+    parser.add_argument("--tflite", default=os.path.join(HERE, "..", "Backend", "temperature_model_pi.tflite"))
+    parser.add_argument("--xgb-models", default=os.path.join(HERE, "..", "models"))
+    parser.add_argument("--xgb-npz", default=os.path.join(HERE, "..", "models", "mendalay_forecast_5h_trees.npz"))
+    parser.add_argument("--models", default="tflite_conv1d,xgb_pickle,xgb_packed,xgb_refit,persistence")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--horizon", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="backtest_report.json")
+    args = parser.parse_args(argv)
+
+    sources = {"tflite_conv1d": args.tflite, "xgb_pickle": args.xgb_models,
+               "xgb_packed": args.xgb_npz, "xgb_refit": None, "persistence": None}
+    specs = {name: sources[name] for name in args.models.split(",")}
+    report = run(args.csv, specs, folds=args.folds, horizon=args.horizon, workers=args.workers)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report["models"].items():
+        for channel, errors in result["channels"].items():
+            flag = "  (in-sample)" if result["in_sample"] else ""
+            print(f"{name:<14} {channel:<12} MAE {errors['mae']}  RMSE {errors['rmse']}{flag}")
+        print(f"{'':<14} latency ms p50={result['latency_ms']['p50']} p95={result['latency_ms']['p95']}")
+    print(f"Report written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
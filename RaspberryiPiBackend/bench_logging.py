@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: logging overhead on the device-control path.
+
+Times a stand-in for set_light_state() (GPIO write replaced by a no-op) under
+the old per-call f-string INFO lines with ConsoleRenderer, and under the dev
+and prod profiles from logging_setup. Output goes to /dev/null so only the
+logging cost is measured.
+
+    python bench_logging.py --calls 20000
+"""
+import argparse
+import logging
+import os
+import time
+
+import structlog
+
+from logging_setup import configure_logging
+
+
+class _NullPi:
+    def write(self, pin, level):
+        pass
+
+
+pi = _NullPi()
+
+
+def set_light_state_legacy(logger, pin: int, state: str):
+    logger.info(f"[DEBUG] Setting pin {pin} to state '{state}'")
+    if state.lower() == "on":
+        pi.write(pin, 1)
+    else:
+        pi.write(pin, 0)
+    logger.info(f"[DEBUG] Pin {pin} set to {'HIGH' if state.lower()=='on' else 'LOW'}")
+
+
+def set_light_state(logger, pin: int, state: str):
+    if state.lower() == "on":
+        pi.write(pin, 1)
+    else:
+        pi.write(pin, 0)
+    logger.debug("Pin set", pin=pin, state=state)
+
+
+def _reset():
+    structlog.reset_defaults()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+def run(name, func, profile, level, calls, sink):
+    _reset()
+    listener = configure_logging(profile=profile, level=level, stream=sink)
+    logger = structlog.get_logger()
+    started = time.perf_counter()
+    for i in range(calls):
+        func(logger, 17, "on" if i % 2 else "off")
+    elapsed = time.perf_counter() - started
+    if listener is not None:
+        listener.stop()  # drain the queue before the sink closes
+    print(f"{name:<32} {elapsed / calls * 1e6:8.2f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as sink:
+        run("legacy f-string INFO (dev)", set_light_state_legacy, "dev", "INFO", args.calls, sink)
+        run("debug call, dev INFO", set_light_state, "dev", "INFO", args.calls, sink)
+        run("debug call, prod INFO", set_light_state, "prod", "INFO", args.calls, sink)
+        run("debug call, prod DEBUG sampled", set_light_state, "prod", "DEBUG", args.calls, sink)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Cloud-to-device command channel over IoT Hub direct methods.
+
+Method names map to the same device-control functions the HTTP endpoints
+use. Each request is acknowledged with a MethodResponse carrying the result
+and the on-device handling time; if the caller includes "sent_at" (epoch
+seconds) in the payload, the cloud-to-device latency is recorded as well.
+Every request gets a response: 404 for an unknown method, 400 for a bad
+payload and 500 for any other handler error.
+"""
+import asyncio
+import time
+from collections import deque
+
+import structlog
+from azure.iot.device import MethodResponse
+
+logger = structlog.get_logger()
+
+
+def _percentiles(values) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": None, "p95": None, "p99": None}
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * pct / 100.0)))]
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+
+class CommandRouter:
+    """
+    Register handlers with add(name, func); func receives the method payload
+    (a dict) and returns a JSON-serialisable result or raises ValueError.
+    Handlers run in a worker thread so GPIO and display I/O never block the loop.
+    """
+
+    def __init__(self, history: int = 500) -> None:
+        self._handlers = {}
+        self._handle_ms = deque(maxlen=history)
+        self._delivery_ms = deque(maxlen=history)
+        self.handled = 0
+        self.failed = 0
+
+    def add(self, name: str, func) -> None:
+        self._handlers[name] = func
+
+    async def dispatch(self, name: str, payload) -> tuple:
+        """Run a command and return (status, response_payload)."""
+        received = time.time()
+        payload = payload or {}
+        if isinstance(payload, dict) and "sent_at" in payload:
+            try:
+                self._delivery_ms.append((received - float(payload["sent_at"])) * 1000.0)
+            except (ValueError, TypeError):
+                pass
+        handler = self._handlers.get(name)
+        if handler is None:
+            self.failed += 1
+            return 404, {"ok": False, "error": f"Unknown method: {name}"}
+        try:
+            result = await asyncio.to_thread(handler, payload)
+            status, body = 200, {"ok": True, "result": result}
+            self.handled += 1
+        except (ValueError, KeyError, TypeError) as e:
+            status, body = 400, {"ok": False, "error": str(e)}
+            self.failed += 1
+        except Exception as e:
+            logger.error("Direct method failed", method=name, error=str(e))
+            status, body = 500, {"ok": False, "error": str(e)}
+            self.failed += 1
+        elapsed_ms = (time.time() - received) * 1000.0
+        self._handle_ms.append(elapsed_ms)
+        body["handled_ms"] = round(elapsed_ms, 2)
+        logger.info("Direct method handled", method=name, status=status, handled_ms=body["handled_ms"])
+        return status, body
+
+    def bind(self, device_client) -> None:
+        """Attach to an asyncio IoTHubDeviceClient (or the local stand-in)."""
+        async def on_method_request(method_request):
+            status, body = await self.dispatch(method_request.name, method_request.payload)
+            response = MethodResponse.create_from_method_request(method_request, status, body)
+            await device_client.send_method_response(response)
+        device_client.on_method_request_received = on_method_request
+
+    def stats(self) -> dict:
+        return {
+            "handled": self.handled,
+            "failed": self.failed,
+            "handle_ms": _percentiles(self._handle_ms),
+            "delivery_ms": _percentiles(self._delivery_ms),
+        }
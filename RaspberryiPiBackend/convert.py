@@ -6,6 +6,8 @@ from tensorflow.keras.layers import Conv1D, Dropout, Flatten, Dense, Reshape
 from tensorflow.keras.callbacks import EarlyStopping
 import tensorflow as tf
 import os
+import tflite_export
+from dataset import sliding_windows
 
 df = pd.read_csv("hourly_interpolated_data.csv", parse_dates=["timestamp"])
 temps = df["temperature_celsius"].values.reshape(-1, 1)
@@ -14,12 +16,7 @@ scaler = MinMaxScaler()
 scaled = scaler.fit_transform(temps)
 
 LOOKBACK, FORWARD = 5, 5
-X, y = [], []
-for i in range(len(scaled) - LOOKBACK - FORWARD + 1):
-    X.append(scaled[i : i + LOOKBACK])
-    y.append(scaled[i + LOOKBACK : i + LOOKBACK + FORWARD])
-X = np.array(X)
-y = np.array(y).reshape(-1, FORWARD, 1)
+X, y = sliding_windows(scaled.astype(np.float32), LOOKBACK, FORWARD)
 
 split = int(0.8 * len(X))
 X_train, X_test = X[:split], X[split:]
@@ -49,19 +46,14 @@ os.makedirs("models", exist_ok=True)
 model.save("models/prediction_model_temp.h5")
 print("✅ Saved Keras model to models/prediction_model_temp.h5")
 
-converter = tf.lite.TFLiteConverter.from_keras_model(model)
-converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
-tflite_model = converter.convert()
+metadata = {"scale_min": float(scaler.data_min_[0]), "scale_max": float(scaler.data_max_[0]),
+            "units": "celsius", "lookback": LOOKBACK, "forward": FORWARD}
+tflite_model, report = tflite_export.export(model, X_train, X_test, y_test, metadata)
 
 tflite_path = "models/temperature_model_pi.tflite"
 with open(tflite_path, "wb") as f:
     f.write(tflite_model)
-print(f"✅ Wrote TFLite model to {tflite_path}")
-
-import subprocess
-ops = subprocess.run(
-    ["strings", tflite_path, "|", "grep", "FULLY_CONNECTED"],
-    shell=True, capture_output=True, text=True
-).stdout.strip()
-print("FULLY_CONNECTED present?", ops or "— none —")
+print(f"✅ Wrote {report['quantization']} TFLite model to {tflite_path}")
+for name in ("dynamic", "int8"):
+    r = report[name]
+    print(f"{name:<8} {r['bytes']:>7} bytes  MAE {r['mae']:.4f} °C  p50 {r['latency_ms']['p50']:.4f} ms")
@@ -0,0 +1,81 @@
+"""
+Sliding-window datasets for the forecasting models.
+
+sliding_windows() returns (X, y) as strided views over the input series: no
+per-sample copies are made, so a memory-mapped multi-year history can be
+windowed in constant memory and only the batches actually fed to a model are
+materialised (see iter_batches()).
+
+Shapes: a (T,) or (T, C) series gives X of (N, lookback, C) and y of
+(N, forward, C'), where C' is the number of target channels.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(series, lookback: int, forward: int, stride: int = 1,
+                    target_channels=None) -> tuple:
+    """
+    Pair every `lookback` steps with the `forward` steps after them, one window
+    every `stride` steps. `target_channels` (an int, slice or list) restricts
+    y to some channels; an int or slice keeps y a view, a list copies.
+    """
+    series = np.asarray(series)  # a memmap stays file-backed; asarray does not copy
+    if series.ndim == 1:
+        series = series[:, None]
+    if series.ndim != 2:
+        raise ValueError(f"Expected a (T,) or (T, C) series, got shape {series.shape}")
+    size = lookback + forward
+    if len(series) < size:
+        channels = series.shape[1]
+        targets = np.empty((0, channels), series.dtype)[:, _channel_index(target_channels)]
+        return (np.empty((0, lookback, channels), series.dtype),
+                np.empty((0, forward, targets.shape[-1]), series.dtype))
+
+    # (N, C, size) -> (N, size, C); both steps are views.
+    windows = sliding_window_view(series, size, axis=0)[::stride].transpose(0, 2, 1)
+    X = windows[:, :lookback, :]
+    y = windows[:, lookback:, :]
+    if target_channels is not None:
+        y = y[:, :, _channel_index(target_channels)]
+    return X, y
+
+
+def _channel_index(target_channels):
+    if target_channels is None:
+        return slice(None)
+    if isinstance(target_channels, int):
+        return slice(target_channels, target_channels + 1)
+    return target_channels
+
+
+def flatten_channels(windows: np.ndarray) -> np.ndarray:
+    """
+    (N, steps, C) -> (N, C * steps), channel-major: all steps of channel 0,
+    then channel 1, ... (the layout the XGBoost forecaster was trained on).
+    """
+    n, steps, channels = windows.shape
+    return np.ascontiguousarray(windows.transpose(0, 2, 1)).reshape(n, channels * steps)
+
+
+def iter_batches(X: np.ndarray, y: np.ndarray, batch_size: int = 32, shuffle: bool = False,
+                 rng=None, dtype=np.float32):
+    """Yield contiguous (X_batch, y_batch) copies; only one batch is resident at a time."""
+    order = np.arange(len(X))
+    if shuffle:
+        (rng or np.random.default_rng()).shuffle(order)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        if not shuffle:
+            idx = slice(idx[0], idx[-1] + 1)
+        yield np.asarray(X[idx], dtype=dtype), np.asarray(y[idx], dtype=dtype)
+
+
+def save_memmap(path: str, array: np.ndarray) -> np.memmap:
+    """Write `array` as .npy and reopen it read-only as a memory map."""
+    np.save(path, np.asarray(array))
+    return open_memmap(path)
+
+
+def open_memmap(path: str) -> np.memmap:
+    return np.load(path, mmap_mode="r")
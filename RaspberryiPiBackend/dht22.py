@@ -0,0 +1,144 @@
+"""
+DHT22 reader decoded from pigpio edge timestamps.
+
+pigpiod samples the GPIO with DMA and hands us microsecond ticks for every
+edge, so the 40-bit frame is timed by the daemon rather than by Python.
+The decoder is a pure function over recorded (level, tick) edges.
+"""
+import statistics
+import threading
+import time
+from collections import deque
+
+import pigpio
+import structlog
+
+logger = structlog.get_logger()
+
+# A '0' bit holds the line high for ~26-28us, a '1' bit for ~70us.
+BIT_THRESHOLD_US = 50
+FRAME_BITS = 40
+# The sensor needs at least 2 s between conversions.
+MIN_READ_INTERVAL = 2.0
+# Retries of a failed frame must finish well inside the 10 s sensor poll.
+RETRY_BUDGET = 5.0
+
+
+def _tick_diff(start: int, end: int) -> int:
+    # pigpio ticks are unsigned 32-bit microseconds and wrap every ~72 minutes.
+    return (end - start) & 0xFFFFFFFF
+
+
+def decode_edges(edges: list) -> tuple:
+    """
+    Decode a DHT22 frame from a list of (level, tick) edges.
+    Returns (temperature_celsius, humidity_percent).
+    Raises ValueError on a short frame, bad checksum or implausible values.
+    """
+    highs = []
+    rise = None
+    for level, tick in edges:
+        if level == 1:
+            rise = tick
+        elif level == 0 and rise is not None:
+            highs.append(_tick_diff(rise, tick))
+            rise = None
+    if len(highs) < FRAME_BITS:
+        raise ValueError(f"Short DHT22 frame: {len(highs)} of {FRAME_BITS} bits")
+
+    # Leading pulses (host release, 80us response preamble) are not data.
+    bits = [1 if width > BIT_THRESHOLD_US else 0 for width in highs[-FRAME_BITS:]]
+    raw = [0] * 5
+    for i, bit in enumerate(bits):
+        raw[i // 8] = (raw[i // 8] << 1) | bit
+
+    if (sum(raw[:4]) & 0xFF) != raw[4]:
+        raise ValueError(f"DHT22 checksum mismatch: {raw}")
+
+    humidity = ((raw[0] << 8) | raw[1]) / 10.0
+    temperature = (((raw[2] & 0x7F) << 8) | raw[3]) / 10.0
+    if raw[2] & 0x80:
+        temperature = -temperature
+    if not (0.0 <= humidity <= 100.0) or not (-40.0 <= temperature <= 80.0):
+        raise ValueError(f"DHT22 values out of range: {temperature}C {humidity}%")
+    return temperature, humidity
+
+
+class DHT22Reader:
+    """
+    Triggers the sensor, collects edges through a pigpio callback and decodes them.
+    Failed frames are retried at the sensor's minimum interval for at most
+    retry_budget seconds, then left to the next scheduled read; good samples
+    feed a rolling median so a single glitchy frame does not reach the API.
+    """
+
+    def __init__(self, pi, gpio: int, retries: int = 3, retry_budget: float = RETRY_BUDGET,
+                 window: int = 5, max_age: float = 60.0) -> None:
+        self.pi = pi
+        self.gpio = gpio
+        self.retries = retries
+        self.retry_budget = retry_budget
+        self.max_age = max_age
+        self._edges = []
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._last_trigger = 0.0
+        pi.set_pull_up_down(gpio, pigpio.PUD_OFF)
+        pi.set_mode(gpio, pigpio.INPUT)
+        self._cb = pi.callback(gpio, pigpio.EITHER_EDGE, self._on_edge)
+
+    def _on_edge(self, gpio, level, tick):
+        if level == pigpio.TIMEOUT:
+            return
+        with self._lock:
+            self._edges.append((level, tick))
+
+    def _capture(self) -> list:
+        wait = MIN_READ_INTERVAL - (time.monotonic() - self._last_trigger)
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            self._edges = []
+        # Host start signal: hold the line low for >1 ms, then release it.
+        self.pi.write(self.gpio, 0)
+        time.sleep(0.018)
+        self.pi.set_mode(self.gpio, pigpio.INPUT)
+        self._last_trigger = time.monotonic()
+        # A full frame takes ~5 ms; leave room for the daemon to deliver callbacks.
+        time.sleep(0.05)
+        with self._lock:
+            return list(self._edges)
+
+    def read_raw(self) -> tuple:
+        """
+        Read one frame, retrying while another attempt fits in retry_budget.
+        Returns (temperature, humidity) or (None, None) if all attempts failed.
+        """
+        deadline = time.monotonic() + self.retry_budget
+        for attempt in range(self.retries):
+            try:
+                return decode_edges(self._capture())
+            except ValueError as e:
+                logger.warning("DHT22 frame rejected", attempt=attempt + 1, error=str(e))
+            # The next attempt cannot trigger before MIN_READ_INTERVAL has passed.
+            if self._last_trigger + MIN_READ_INTERVAL > deadline:
+                break
+        return None, None
+
+    def read(self) -> tuple:
+        """
+        Return the rolling median of recent good samples.
+        Samples older than max_age are ignored, so a dead sensor reads (None, None).
+        """
+        temp, hum = self.read_raw()
+        now = time.monotonic()
+        if temp is not None:
+            self._samples.append((now, temp, hum))
+        fresh = [s for s in self._samples if now - s[0] <= self.max_age]
+        if not fresh:
+            return None, None
+        return (statistics.median(s[1] for s in fresh),
+                statistics.median(s[2] for s in fresh))
+
+    def cancel(self) -> None:
+        self._cb.cancel()
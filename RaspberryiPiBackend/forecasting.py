@@ -0,0 +1,144 @@
+"""
+Variable-horizon forecasts over the hourly sensor history.
+
+A ForecastModel maps a batch of windows (B, lookback, C) to the next
+`steps` values (B, steps, C) for its channels. Horizons longer than `steps`
+are produced by recursive rollout: each block of predictions is appended to
+the window and fed back. The model emits a whole block per invocation, and
+every history in a batch is advanced by the same invocation, so a 24 h
+rollout for one history costs ceil(24 / steps) invokes.
+
+Forecaster caches the longest rollout computed for each
+(history version, model, model version); any shorter horizon is a slice of
+it, so dashboard widgets asking for different horizons share one inference.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+MAX_HORIZON = 48
+
+
+class HourlyHistory:
+    """Per-channel hourly values; `version` changes whenever a value is appended."""
+
+    def __init__(self, channels: tuple, maxlen: int = 24 * 7) -> None:
+        self.channels = tuple(channels)
+        self._values = {name: deque(maxlen=maxlen) for name in self.channels}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def append(self, **values) -> None:
+        with self._lock:
+            for name in self.channels:
+                series = self._values[name]
+                value = values.get(name)
+                if value is None:
+                    value = series[-1] if series else None
+                if value is not None:
+                    series.append(float(value))
+            self.version += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            for series in self._values.values():
+                series.clear()
+            self.version += 1
+
+    def window(self, channels: tuple, lookback: int):
+        """(version, array of shape (lookback, C)); short series are back-filled with their oldest value."""
+        with self._lock:
+            columns = []
+            for name in channels:
+                series = list(self._values[name])
+                if not series:
+                    raise ValueError(f"No history for {name} yet")
+                series = series[-lookback:]
+                columns.append([series[0]] * (lookback - len(series)) + series)
+            return self.version, np.asarray(columns, dtype=np.float32).T
+
+    def latest(self, name: str, count: int) -> list:
+        with self._lock:
+            return list(self._values[name])[-count:]
+
+
+class ForecastModel:
+    """Adapter around a step function; `version` is a callable returning the model's current version."""
+
+    def __init__(self, name: str, channels: tuple, lookback: int, steps: int, step, version=None) -> None:
+        self.name = name
+        self.channels = tuple(channels)
+        self.lookback = lookback
+        self.steps = steps
+        self.step = step
+        self.version = version or (lambda: None)
+
+
+def rollout(model: ForecastModel, windows: np.ndarray, horizon: int) -> np.ndarray:
+    """Recursive multi-step forecast: (B, lookback, C) -> (B, horizon, C)."""
+    windows = np.asarray(windows, dtype=np.float32)
+    blocks = []
+    produced = 0
+    while produced < horizon:
+        block = np.asarray(model.step(windows), dtype=np.float32).reshape(len(windows), model.steps, -1)
+        blocks.append(block)
+        produced += model.steps
+        windows = np.concatenate([windows, block], axis=1)[:, -model.lookback:]
+    return np.concatenate(blocks, axis=1)[:, :horizon]
+
+
+class Forecaster:
+    def __init__(self, history: HourlyHistory) -> None:
+        self.history = history
+        self.models = []
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.invocations = 0
+
+    def add_model(self, model: ForecastModel) -> None:
+        """Models registered first take precedence for a channel."""
+        self.models.append(model)
+
+    def channels(self) -> list:
+        return sorted({name for model in self.models for name in model.channels})
+
+    def _model_for(self, channel: str) -> ForecastModel:
+        for model in self.models:
+            if channel in model.channels:
+                return model
+        raise ValueError(f"No forecast model for channel '{channel}'")
+
+    def _rollout(self, model: ForecastModel, horizon: int) -> tuple:
+        version, window = self.history.window(model.channels, model.lookback)
+        model_version = model.version()
+        key = (version, model.name, model_version)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.shape[0] >= horizon:
+                return cached, version, model_version
+            # Round up to whole blocks: the extra steps come free and serve later, longer requests.
+            length = -(-horizon // model.steps) * model.steps
+            predictions = rollout(model, window[None], length)[0]
+            self.invocations += -(-length // model.steps)
+            # Only the current history version is worth keeping.
+            self._cache = {k: v for k, v in self._cache.items() if k[0] == version}
+            self._cache[key] = predictions
+            return predictions, version, model_version
+
+    def forecast(self, channels, horizon: int) -> dict:
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f"horizon must be between 1 and {MAX_HORIZON}")
+        result = {"horizon": horizon, "history_version": None, "channels": {}}
+        for channel in channels:
+            model = self._model_for(channel)
+            predictions, version, model_version = self._rollout(model, horizon)
+            column = model.channels.index(channel)
+            result["history_version"] = version
+            result["channels"][channel] = {
+                "history": self.history.latest(channel, model.lookback),
+                "forecast": [round(float(v), 2) for v in predictions[:horizon, column]],
+                "model": model.name,
+                "model_version": model_version,
+            }
+        return result
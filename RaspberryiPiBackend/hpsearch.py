@@ -0,0 +1,312 @@
+"""
+Parallel hyperparameter search for the forecasting models.
+
+Random configurations from SPACES are run with successive halving. Every
+trial first gets the smallest budget (epochs for the Conv1D model, boosting
+rounds for XGBoost). Only the best 1/eta by validation MAE go on to the
+next, eta-times larger budget, so poor configurations are pruned after a
+few cheap epochs. Inside a trial, Keras EarlyStopping or XGBoost
+early_stopping_rounds end training once the validation loss stalls.
+
+Windows are built once per lookback and written as .npy files under the
+work directory. Trials memory-map them instead of re-reading the CSV or
+receiving pickled arrays. Trials run in a spawned process pool, one per
+core, with every thread pool (BLAS, TensorFlow, XGBoost) capped at a single
+thread.
+
+The series is split chronologically into train, validation and test
+slices. The validation slice drives early stopping, rung pruning, the int8
+gate and the choice of the best trial, so its MAE is optimistic. The last
+TEST_FRACTION is never written to the work directory or seen by a trial;
+the exported artifact is scored on it once, after the search, and that
+"test_mae" is the number to quote. (backtest.py is no substitute: its test
+folds cover the last half of the file, which overlaps these training rows.)
+
+Survivors of the last rung write their artifact. The best one is copied to
+--out in the format the backend serves:
+- conv1d: TFLite via tflite_export.py (int8 when it passes the MAE gate,
+  scaling and hyperparameters embedded).
+- xgb: a packed-tree .npz via tree_export.py.
+
+    python hpsearch.py --family conv1d --trials 24 --out models/temperature_model_pi.tflite
+    python hpsearch.py --family xgb --trials 24 --out ../models/mendalay_forecast_5h_trees.npz
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from dataset import flatten_channels, open_memmap, save_memmap, sliding_windows
+from ingest import load_series
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHANNELS = ("temperature", "humidity")
+FORWARD = 5
+VAL_FRACTION = 0.2
+TEST_FRACTION = 0.1
+KERAS_PATIENCE = 3
+XGB_PATIENCE = 20
+# Inherited by the spawned trial processes before they import numpy or TensorFlow;
+# set only while the pool is alive (see _thread_env), not for the caller's process.
+THREAD_ENV = {
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "TF_NUM_INTRAOP_THREADS": "1",
+    "TF_NUM_INTEROP_THREADS": "1",
+    "TF_CPP_MIN_LOG_LEVEL": "2",
+}
+SPACES = {
+    "conv1d": {
+        # app.py serves 5-hour windows to the TFLite model; widen only together with it.
+        "lookback": [5],
+        "filters": [8, 16, 32, 64],
+        "kernel_size": [2, 3],
+        "dense": [16, 32, 64, 128],
+        "dropout": [0.0, 0.1, 0.2, 0.3],
+        "learning_rate": [3e-4, 1e-3, 3e-3],
+        "batch_size": [32, 64],
+    },
+    "xgb": {
+        # TreeEnsemble reads n_past from the .npz, so the lookback is free here.
+        "lookback": [3, 5, 8, 12],
+        "max_depth": [3, 4, 5, 6, 8],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "subsample": [0.7, 0.85, 1.0],
+        "colsample_bytree": [0.7, 1.0],
+        "min_child_weight": [1, 5, 10],
+    },
+}
+# (smallest, largest) budget: epochs for conv1d, boosting rounds for xgb.
+BUDGETS = {"conv1d": (4, 50), "xgb": (50, 800)}
+ARTIFACTS = {"conv1d": ".tflite", "xgb": ".npz"}
+
+
+def sample_configs(space: dict, count: int, rng) -> list:
+    return [{name: choices[rng.integers(len(choices))] for name, choices in space.items()} for _ in range(count)]
+
+
+def rung_budgets(smallest: int, largest: int, eta: int) -> list:
+    budgets = []
+    budget = smallest
+    while budget < largest:
+        budgets.append(budget)
+        budget *= eta
+    return budgets + [largest]
+
+
+def prepare(series: np.ndarray, work_dir: str, lookbacks, val_fraction: float = VAL_FRACTION) -> dict:
+    """
+    Write train/validation windows of `series` (the test slice already removed) per
+    lookback; returns {"stats": ..., "windows": {lookback: {name: path}}}.
+    """
+    split = int(len(series) * (1 - val_fraction))
+    train = series[:split]
+    windows = {}
+    for lookback in lookbacks:
+        X_train, y_train = sliding_windows(train, lookback, FORWARD)
+        # Validation origins start at `split`; their windows may look back into training rows.
+        X_val, y_val = sliding_windows(series[split - lookback:], lookback, FORWARD)
+        paths = {}
+        for name, array in (("X_train", X_train), ("y_train", y_train), ("X_val", X_val), ("y_val", y_val)):
+            paths[name] = os.path.join(work_dir, f"lookback{lookback}_{name}.npy")
+            save_memmap(paths[name], array)
+        windows[lookback] = paths
+    stats = {"scale_min": float(train[:, 0].min()), "scale_max": float(train[:, 0].max()),
+             "train_rows": int(split), "val_rows": int(len(series) - split)}
+    return {"stats": stats, "windows": windows}
+
+
+def _conv1d_trial(params: dict, budget: int, data: dict, stats: dict, artifact: str) -> dict:
+    import tensorflow as tf
+    import tflite_export
+    from retrain_worker import build_model
+
+    low, high = stats["scale_min"], stats["scale_max"]
+    scale = (high - low) or 1.0
+    X_train, y_train, X_val, y_val = ((np.asarray(data[name][..., :1]) - low) / scale
+                                      for name in ("X_train", "y_train", "X_val", "y_val"))
+    architecture = {k: params[k] for k in ("lookback", "filters", "kernel_size", "dense", "dropout",
+                                           "learning_rate")}
+    model = build_model(forward=FORWARD, **architecture)
+    es = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=KERAS_PATIENCE, restore_best_weights=True)
+    history = model.fit(X_train, y_train, validation_data=(X_val, y_val), epochs=budget,
+                        batch_size=params["batch_size"], shuffle=True, callbacks=[es], verbose=0)
+    mae = float(np.abs(model.predict(X_val, verbose=0) - y_val).mean()) * scale
+    result = {"mae": mae, "used": len(history.epoch)}
+    if artifact:
+        metadata = {"scale_min": low, "scale_max": high, "units": "celsius", "lookback": params["lookback"],
+                    "forward": FORWARD, "hyperparameters": params}
+        content, report = tflite_export.export(model, X_train, X_val, y_val, metadata)
+        with open(artifact, "wb") as f:
+            f.write(content)
+        result["export"] = report
+    return result
+
+
+def _xgb_trial(params: dict, budget: int, data: dict, stats: dict, artifact: str) -> dict:
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBRegressor
+
+    X_train, y_train, X_val, y_val = (flatten_channels(np.asarray(data[name], dtype=np.float64))
+                                      for name in ("X_train", "y_train", "X_val", "y_val"))
+    scaler_X = StandardScaler().fit(X_train)
+    scaler_y = StandardScaler().fit(y_train)
+    X_fit, X_eval = scaler_X.transform(X_train), scaler_X.transform(X_val)
+    y_fit, y_eval = scaler_y.transform(y_train), scaler_y.transform(y_val)
+    settings = {k: v for k, v in params.items() if k != "lookback"}
+
+    boosters, rounds, columns = [], [], []
+    for output in range(y_fit.shape[1]):
+        regressor = XGBRegressor(n_estimators=budget, early_stopping_rounds=XGB_PATIENCE, n_jobs=1,
+                                 tree_method="hist", **settings)
+        regressor.fit(X_fit, y_fit[:, output], eval_set=[(X_eval, y_eval[:, output])], verbose=False)
+        # Drop the rounds after the best iteration so the export matches what was scored.
+        booster = regressor.get_booster()[: regressor.best_iteration + 1]
+        boosters.append(booster)
+        rounds.append(regressor.best_iteration + 1)
+        columns.append(booster.inplace_predict(X_eval))
+    predictions = scaler_y.inverse_transform(np.stack(columns, axis=1))
+    errors = np.abs(predictions - y_val)
+    # Channel-major targets: the first FORWARD columns are temperature.
+    result = {"mae": float(errors[:, :FORWARD].mean()), "humidity_mae": float(errors[:, FORWARD:].mean()),
+              "used": int(max(rounds))}
+    if artifact:
+        import tree_export
+
+        config = {"n_past": params["lookback"], "n_future": FORWARD}
+        result["export"] = tree_export.export_boosters(boosters, scaler_X, scaler_y, config, artifact)
+    return result
+
+
+TRIALS = {"conv1d": _conv1d_trial, "xgb": _xgb_trial}
+
+
+def test_mae(family: str, artifact: str, series: np.ndarray, start: int) -> dict:
+    """MAE of an exported artifact, as served, over the forecast origins from `start` on."""
+    if family == "xgb":
+        from tree_export import TreeEnsemble
+
+        ensemble = TreeEnsemble(artifact)
+        X, y = sliding_windows(series[start - ensemble.n_past:], ensemble.n_past, FORWARD)
+        errors = np.abs(ensemble.step(X) - y)
+        return {"mae": float(errors[..., 0].mean()), "humidity_mae": float(errors[..., 1].mean()),
+                "windows": int(len(X))}
+
+    import tflite_export
+
+    with open(artifact, "rb") as f:
+        content = f.read()
+    metadata = tflite_export.read_json_metadata(content)
+    low, high = metadata["scale_min"], metadata["scale_max"]
+    scale = (high - low) or 1.0
+    X, y = sliding_windows(series[start - metadata["lookback"]:, :1], metadata["lookback"], FORWARD)
+    model = tflite_export.interpreter(model_content=content)
+    predictions = tflite_export.run(model, ((X - low) / scale).astype(np.float32)).reshape(y.shape)
+    return {"mae": float(np.abs(predictions * scale + low - y).mean()), "windows": int(len(X))}
+
+
+def run_trial(task: tuple) -> dict:
+    """Worker: one configuration at one budget. Windows are memory-mapped, not passed."""
+    family, trial, params, budget, paths, stats, artifact = task
+    data = {name: open_memmap(path) for name, path in paths.items()}
+    started = time.perf_counter()
+    result = TRIALS[family](params, budget, data, stats, artifact)
+    return {"trial": trial, "params": params, "budget": budget, "artifact": artifact,
+            "elapsed_s": round(time.perf_counter() - started, 2), **result}
+
+
+@contextmanager
+def _thread_env():
+    saved = {name: os.environ.get(name) for name in THREAD_ENV}
+    os.environ.update(THREAD_ENV)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def search(family: str, csv_path: str, trials: int = 24, eta: int = 3, workers: int = None,
+           seed: int = 0, work_dir: str = None, budgets: tuple = None) -> dict:
+    rng = np.random.default_rng(seed)
+    configs = sample_configs(SPACES[family], trials, rng)
+    budgets = rung_budgets(*(budgets or BUDGETS[family]), eta)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="hpsearch.")
+    os.makedirs(work_dir, exist_ok=True)
+    series = load_series(csv_path, CHANNELS)
+    test_start = int(len(series) * (1 - TEST_FRACTION))
+    data = prepare(series[:test_start], work_dir, sorted({int(c["lookback"]) for c in configs}))
+
+    started = time.perf_counter()
+    history = []
+    alive = list(range(trials))
+    context = multiprocessing.get_context("spawn")
+    with _thread_env(), ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as pool:
+        for rung, budget in enumerate(budgets):
+            last = rung == len(budgets) - 1
+            tasks = [(family, i, configs[i], budget, data["windows"][int(configs[i]["lookback"])], data["stats"],
+                      os.path.join(work_dir, f"trial{i}{ARTIFACTS[family]}") if last else None)
+                     for i in alive]
+            results = sorted(pool.map(run_trial, tasks), key=lambda r: r["mae"])
+            for result in results:
+                history.append({"rung": rung, **result})
+            print(f"rung {rung}: budget {budget}, {len(results)} trials, best MAE {results[0]['mae']:.4f} "
+                  f"(trial {results[0]['trial']})")
+            if not last:
+                alive = [r["trial"] for r in results[:max(1, len(results) // eta)]]
+
+    best = results[0]
+    best["test"] = test_mae(family, best["artifact"], series, test_start)
+    return {
+        "family": family,
+        "dataset": os.path.abspath(csv_path),
+        "stats": {**data["stats"], "test_rows": int(len(series) - test_start)},
+        "budgets": budgets,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "best": best,
+        "trials": history,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hyperparameter search for the forecasting models")
+    parser.add_argument("--family", choices=sorted(SPACES), required=True)
+    parser.add_argument("--csv", default=os.path.join(HERE, "..", "Mendalay.csv"))
+    parser.add_argument("--trials", type=int, default=24)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-budget", type=int, default=None)
+    parser.add_argument("--max-budget", type=int, default=None)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--report", default="hpsearch_report.json")
+    args = parser.parse_args(argv)
+
+    smallest, largest = BUDGETS[args.family]
+    budgets = (args.min_budget or smallest, args.max_budget or largest)
+    report = search(args.family, args.csv, args.trials, args.eta, args.workers, args.seed, args.work_dir, budgets)
+    shutil.copyfile(report["best"]["artifact"], args.out)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    best = report["best"]
+    print(f"Best trial {best['trial']}: validation MAE {best['mae']:.4f} (optimistic), "
+          f"test MAE {best['test']['mae']:.4f} with {json.dumps(best['params'])}")
+    print(f"Exported to {args.out}; report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Climate dataset ingest with a columnar on-disk cache.
+
+CSV files are parsed once, in chunks, with an explicit timestamp format,
+and written as one raw binary file per column under
+"<cache_dir>/<csv name>.<sha256 prefix>/", plus meta.json with dtypes, row
+count and the categories of text columns. While the source file's hash is
+unchanged, load_columns() just memory-maps those files, so even multi-city
+histories that do not fit in RAM can be windowed (see dataset.py).
+
+Column names are normalised: mojibake such as "Â°" is repaired, units in
+brackets are dropped, names are snake_cased and common variants are mapped
+through COLUMN_ALIASES ("Relative Humidity [%]" -> "humidity").
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+MENDALAY_TIMESTAMP_FORMAT = "%d/%m/%Y %H:%M:%S"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_cache")
+COLUMN_ALIASES = {
+    "relative_humidity": "humidity",
+    "relativehumidity": "humidity",
+    "temp": "temperature",
+    "pm2_5": "pm25",
+    "ts": "timestamp",
+}
+_MOJIBAKE = {"Â°": "°", "Âµ": "µ"}
+
+
+def normalize_column(name: str) -> str:
+    for bad, good in _MOJIBAKE.items():
+        name = name.replace(bad, good)
+    name = re.sub(r"\[.*?\]", "", name).strip().lower()
+    name = re.sub(r"[^0-9a-z]+", "_", name.replace(".", "_")).strip("_")
+    return COLUMN_ALIASES.get(name, name)
+
+
+def file_hash(path: str, chunk_bytes: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parse_timestamps(values, timestamp_format: str) -> np.ndarray:
+    """Epoch seconds (int64) from a chunk of timestamp strings or numbers."""
+    import pandas as pd
+
+    if timestamp_format == "epoch":
+        return np.asarray(values, dtype=np.float64).astype(np.int64)
+    parsed = pd.to_datetime(values, format=timestamp_format)
+    return parsed.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def build_cache(csv_path: str, target: str, timestamp_column: str = "timestamp",
+                timestamp_format: str = MENDALAY_TIMESTAMP_FORMAT, chunk_rows: int = 100_000) -> dict:
+    """Parse `csv_path` chunk by chunk into per-column binary files under `target`."""
+    import pandas as pd
+
+    staging = tempfile.mkdtemp(prefix=os.path.basename(target) + ".", dir=os.path.dirname(target))
+    files, columns, categories, rows = {}, {}, {}, 0
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, encoding="utf-8", encoding_errors="replace"):
+            chunk.columns = [normalize_column(c) for c in chunk.columns]
+            for name in chunk.columns:
+                series = chunk[name]
+                if name == timestamp_column:
+                    values = _parse_timestamps(series.to_numpy(), timestamp_format)
+                elif series.dtype == object:
+                    # Text (e.g. city or device id): store int32 codes into a growing category list.
+                    lookup = categories.setdefault(name, {})
+                    values = np.fromiter((lookup.setdefault(v, len(lookup)) for v in series.astype(str)),
+                                         dtype=np.int32, count=len(series))
+                else:
+                    values = series.to_numpy(dtype=np.float64)
+                if name not in files:
+                    files[name] = open(os.path.join(staging, name + ".bin"), "wb")
+                    columns[name] = values.dtype.str
+                elif values.dtype.str != columns[name]:
+                    values = values.astype(columns[name])
+                files[name].write(np.ascontiguousarray(values).tobytes())
+            rows += len(chunk)
+        for f in files.values():
+            f.close()
+        meta = {
+            "source": os.path.abspath(csv_path),
+            "rows": rows,
+            "columns": columns,
+            "categories": {name: list(lookup) for name, lookup in categories.items()},
+            "timestamp_column": timestamp_column,
+        }
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.replace(staging, target)
+    except BaseException:
+        for f in files.values():
+            f.close()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return meta
+
+
+def load_columns(csv_path: str, cache_dir: str = DEFAULT_CACHE_DIR, **parse_options) -> tuple:
+    """
+    Return (columns, meta): a dict of read-only memory-mapped arrays keyed by the
+    normalised column name, building or rebuilding the cache if the source changed.
+    Timestamps are int64 epoch seconds; text columns are int32 codes into meta["categories"].
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    target = os.path.join(cache_dir, f"{os.path.basename(csv_path)}.{file_hash(csv_path)[:16]}")
+    if os.path.exists(os.path.join(target, "meta.json")):
+        with open(os.path.join(target, "meta.json")) as f:
+            meta = json.load(f)
+    else:
+        meta = build_cache(csv_path, target, **parse_options)
+        # Drop caches of earlier versions of the same file.
+        prefix = os.path.basename(csv_path) + "."
+        for entry in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, entry)
+            if entry.startswith(prefix) and path != target and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+    columns = {}
+    for name, dtype in meta["columns"].items():
+        path = os.path.join(target, name + ".bin")
+        columns[name] = (np.memmap(path, dtype=np.dtype(dtype), mode="r", shape=(meta["rows"],))
+                         if meta["rows"] else np.empty(0, dtype=np.dtype(dtype)))
+    return columns, meta
+
+
+def ffill(values: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs along axis 0 (leading NaNs are left as they are)."""
+    values = np.array(values, dtype=np.float64 if values.dtype.kind != "f" else values.dtype)
+    mask = np.isnan(values)
+    if not mask.any():
+        return values
+    index = np.where(~mask, np.arange(len(values)).reshape(-1, *([1] * (values.ndim - 1))), 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    return np.take_along_axis(values, index, axis=0)
+
+
+def load_series(csv_path: str, channels=("temperature", "humidity"), dtype=np.float32,
+                fill: bool = True, **options) -> np.ndarray:
+    """(T, C) array of the chosen channels, forward-filled, for the forecasting code."""
+    columns, _ = load_columns(csv_path, **options)
+    series = np.stack([columns[name] for name in channels], axis=1)
+    return (ffill(series) if fill else series).astype(dtype)
+
+
+def load_frame(csv_path: str, **options):
+    """pandas DataFrame indexed by timestamp with normalised columns (for notebooks)."""
+    import pandas as pd
+
+    columns, meta = load_columns(csv_path, **options)
+    data = {}
+    for name, values in columns.items():
+        if name in meta["categories"]:
+            data[name] = pd.Categorical.from_codes(np.asarray(values), meta["categories"][name])
+        elif name == meta["timestamp_column"]:
+            data[name] = pd.to_datetime(np.asarray(values), unit="s")
+        else:
+            data[name] = np.asarray(values)
+    frame = pd.DataFrame(data)
+    if meta["timestamp_column"] in frame:
+        frame = frame.set_index(meta["timestamp_column"])
+    return frame
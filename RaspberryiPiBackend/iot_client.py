@@ -0,0 +1,147 @@
+"""
+Asyncio IoT Hub connection with cached DPS provisioning.
+
+The hub assigned by the Device Provisioning Service rarely changes, so the
+result of register() is cached on disk with an expiry. Warm starts connect
+straight to the cached hub; DPS is only contacted again when the cache has
+expired or the cached hub rejects the device (CredentialError: bad
+credentials or a device it no longer knows). Other connect failures, such
+as a network outage, leave the cache in place and are retried by the caller.
+"""
+import asyncio
+import json
+import os
+import time
+
+import structlog
+from azure.iot.device.aio import ProvisioningDeviceClient, IoTHubDeviceClient
+from azure.iot.device.exceptions import CredentialError
+
+logger = structlog.get_logger()
+
+PROVISIONING_HOST = "global.azure-devices-provisioning.net"
+PROVISIONING_CACHE_FILE = "dps_cache.json"
+PROVISIONING_CACHE_TTL = 7 * 24 * 3600
+
+
+class ProvisioningCache:
+    """Assigned hub and device id persisted as JSON, valid for `ttl` seconds."""
+
+    def __init__(self, path: str = PROVISIONING_CACHE_FILE, ttl: float = PROVISIONING_CACHE_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+
+    def load(self, registration_id: str):
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry.get("registration_id") != registration_id or entry.get("expires_at", 0) < time.time():
+            return None
+        return entry
+
+    def save(self, registration_id: str, assigned_hub: str, device_id: str) -> dict:
+        entry = {
+            "registration_id": registration_id,
+            "assigned_hub": assigned_hub,
+            "device_id": device_id,
+            "expires_at": time.time() + self.ttl,
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self.path)
+        return entry
+
+    def invalidate(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def provision(id_scope: str, registration_id: str, symmetric_key: str, cache: ProvisioningCache) -> dict:
+    provisioning_client = ProvisioningDeviceClient.create_from_symmetric_key(
+        provisioning_host=PROVISIONING_HOST,
+        registration_id=registration_id,
+        id_scope=id_scope,
+        symmetric_key=symmetric_key
+    )
+    registration_result = await provisioning_client.register()
+    if registration_result.status != "assigned":
+        raise RuntimeError("Could not register device. Status: {}".format(registration_result.status))
+    state = registration_result.registration_state
+    logger.info("DPS registration complete", hub=state.assigned_hub)
+    return cache.save(registration_id, state.assigned_hub, state.device_id or registration_id)
+
+
+async def connect_device(id_scope: str, registration_id: str, symmetric_key: str,
+                         cache: ProvisioningCache = None):
+    """
+    Return a connected asyncio IoTHubDeviceClient.
+    Uses the cached assignment when possible and falls back to DPS if the cached hub
+    rejects the device; transient failures are raised with the cache kept.
+    """
+    cache = cache or ProvisioningCache()
+    entry = cache.load(registration_id)
+    from_cache = entry is not None
+    if entry is None:
+        entry = await provision(id_scope, registration_id, symmetric_key, cache)
+    while True:
+        device_client = IoTHubDeviceClient.create_from_symmetric_key(
+            symmetric_key=symmetric_key,
+            hostname=entry["assigned_hub"],
+            device_id=entry["device_id"]
+        )
+        try:
+            await device_client.connect()
+            return device_client
+        except CredentialError as e:
+            await device_client.shutdown()
+            if not from_cache:
+                raise
+            logger.warning("Cached IoT Hub assignment rejected; re-provisioning", error=str(e))
+            cache.invalidate()
+            entry = await provision(id_scope, registration_id, symmetric_key, cache)
+            from_cache = False
+        except Exception:
+            await device_client.shutdown()
+            raise
+
+
+async def run_forwarder(queue, connect, make_message, max_rate: float = 2.0,
+                        max_backoff: float = 300.0, idle_interval: float = 1.0) -> None:
+    """
+    Drain a spool.DiskQueue through an asyncio device client, oldest first.
+    `connect` is a coroutine function returning a connected client; on any
+    failure the client is dropped and reconnected with exponential backoff.
+    Spool reads and acks (file I/O and fsync) run in a worker thread so they do
+    not delay direct-method handlers sharing this loop.
+    """
+    device_client = None
+    backoff = 1.0
+    interval = 1.0 / max_rate if max_rate > 0 else 0.0
+    while True:
+        try:
+            if device_client is None:
+                device_client = await connect()
+                logger.info("IoT Hub connected", pending_bytes=await asyncio.to_thread(queue.pending_bytes))
+                backoff = 1.0
+            record = await asyncio.to_thread(queue.peek)
+            if record is None:
+                await asyncio.sleep(idle_interval)
+                continue
+            await device_client.send_message(make_message(record.payload))
+            await asyncio.to_thread(queue.ack, record)
+            await asyncio.sleep(interval)
+        except Exception as e:
+            logger.warning("IoT Hub unreachable; telemetry stays spooled", error=str(e), retry_in=backoff)
+            if device_client is not None:
+                try:
+                    await device_client.shutdown()
+                except Exception:
+                    pass
+                device_client = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
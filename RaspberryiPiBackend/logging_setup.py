@@ -0,0 +1,118 @@
+"""
+structlog configuration profiles.
+
+"dev" keeps the colourised ConsoleRenderer on stdout. "prod" is meant for the
+Pi in service: calls below the configured level are rejected by the bound
+logger before any processor runs, hot-path events are rate-sampled, records
+are rendered as compact JSON, and a QueueHandler hands them to a listener
+thread so a slow stdout/journal never blocks device control.
+
+Select with SMARTAURA_LOG_PROFILE=prod and SMARTAURA_LOG_LEVEL=WARNING etc.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+import structlog
+
+# Event name -> max records per second; the rest are dropped and counted.
+DEFAULT_SAMPLE_RATES = {
+    "Pin set": 5,
+    "Direct method handled": 20,
+    "DHT22 frame rejected": 1,
+}
+
+
+class RateSampler:
+    """structlog processor: per-event token bucket that drops excess records."""
+
+    def __init__(self, rates: dict) -> None:
+        self.rates = rates
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, logger, method_name, event_dict):
+        event = event_dict.get("event")
+        rate = self.rates.get(event)
+        if rate is None:
+            return event_dict
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(event, (rate, now, 0))
+            tokens = min(rate, tokens + (now - last) * rate)
+            if tokens < 1:
+                self._buckets[event] = (tokens, now, dropped + 1)
+                raise structlog.DropEvent
+            self._buckets[event] = (tokens - 1, now, 0)
+        if dropped:
+            event_dict["sampled_out"] = dropped
+        return event_dict
+
+
+def _json_dumps(obj, **kwargs) -> str:
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+def _stop_listener(listener) -> None:
+    # QueueListener.stop() is not idempotent; callers may already have stopped it.
+    if getattr(listener, "_thread", None) is not None:
+        listener.stop()
+
+
+def configure_logging(profile: str = None, level: str = None, sample_rates: dict = None,
+                      stream=None):
+    """Configure structlog; returns the QueueListener in the prod profile, else None."""
+    profile = (profile or os.environ.get("SMARTAURA_LOG_PROFILE", "dev")).lower()
+    level_no = logging.getLevelName((level or os.environ.get("SMARTAURA_LOG_LEVEL", "INFO")).upper())
+    stream = stream or sys.stdout
+
+    if profile != "prod":
+        logging.basicConfig(stream=stream, level=level_no, format="%(message)s", force=True)
+        structlog.configure(
+            processors=[
+                structlog.stdlib.filter_by_level,
+                structlog.processors.TimeStamper(fmt="iso"),
+                structlog.stdlib.add_log_level,
+                structlog.processors.StackInfoRenderer(),
+                structlog.processors.format_exc_info,
+                structlog.dev.ConsoleRenderer(),
+            ],
+            context_class=dict,
+            logger_factory=structlog.stdlib.LoggerFactory(),
+            wrapper_class=structlog.stdlib.BoundLogger,
+            cache_logger_on_first_use=True,
+        )
+        return None
+
+    # All records go through an in-memory queue; one listener thread does the I/O.
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=False)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level_no)
+
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            RateSampler(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates),
+            structlog.processors.TimeStamper(fmt=None, utc=True),
+            structlog.processors.format_exc_info,
+            structlog.processors.JSONRenderer(serializer=_json_dumps),
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        # Level filtering happens here, before any processor or formatting runs.
+        wrapper_class=structlog.make_filtering_bound_logger(level_no),
+        cache_logger_on_first_use=True,
+    )
+    return listener
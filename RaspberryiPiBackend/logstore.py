@@ -0,0 +1,405 @@
+"""
+Persistence for the system and voice JSON-lines logs.
+
+Callers hand entries to LogWriter.write(), which only enqueues; a background
+thread batches them and appends to the file when the batch is full or the
+flush interval has passed, so request handlers never wait on SD-card I/O.
+
+While appending, the writer records the byte offset of every INDEX_EVERY-th
+entry together with its timestamp in a sidecar ".idx" file. Reads bisect
+that sparse index and seek straight to the requested window, so a page
+costs the same whether the log holds a day or a year.
+
+The active file is rotated by size or calendar day into gzip segments under
+an archive directory. Each segment starts with a fixed header holding its
+first/last timestamps, so range queries open only overlapping segments and
+decompress them as a stream. Retention prunes segments by age and total size.
+"""
+import bisect
+import gzip
+import json
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from collections import deque
+
+import structlog
+
+logger = structlog.get_logger()
+
+_STOP = object()
+_INDEX_RECORD = struct.Struct("<dQ")  # timestamp, byte offset
+INDEX_EVERY = 64
+_SEGMENT_HEADER = struct.Struct("<4sHddQ")  # magic, version, first ts, last ts, raw bytes
+_SEGMENT_MAGIC = b"SALG"
+SEGMENT_SUFFIX = ".seg.gz"
+
+
+class Segment:
+    __slots__ = ("path", "first", "last", "raw_bytes", "size")
+
+    def __init__(self, path: str, first: float, last: float, raw_bytes: int, size: int) -> None:
+        self.path = path
+        self.first = first
+        self.last = last
+        self.raw_bytes = raw_bytes
+        self.size = size
+
+    @classmethod
+    def open_header(cls, path: str):
+        with open(path, "rb") as f:
+            header = f.read(_SEGMENT_HEADER.size)
+        if len(header) < _SEGMENT_HEADER.size:
+            return None
+        magic, _version, first, last, raw_bytes = _SEGMENT_HEADER.unpack(header)
+        if magic != _SEGMENT_MAGIC:
+            return None
+        return cls(path, first, last, raw_bytes, os.path.getsize(path))
+
+    def overlaps(self, after: float = None, before: float = None) -> bool:
+        return (after is None or self.last > after) and (before is None or self.first < before)
+
+    def iter_lines(self):
+        """Decompress the segment as a stream, yielding raw JSON lines."""
+        with open(self.path, "rb") as f:
+            f.seek(_SEGMENT_HEADER.size)
+            with gzip.GzipFile(fileobj=f, mode="rb") as gz:
+                for line in gz:
+                    if line.strip():
+                        yield line.rstrip(b"\n")
+
+
+class LogIndex:
+    """Sparse (timestamp, offset) index kept in memory and appended to `path`."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.timestamps = []
+        self.offsets = []
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        usable = len(data) - len(data) % _INDEX_RECORD.size
+        for ts, off in _INDEX_RECORD.iter_unpack(data[:usable]):
+            self.timestamps.append(ts)
+            self.offsets.append(off)
+
+    def truncate_after(self, size: int) -> None:
+        """Forget index points beyond `size` bytes (the log was truncated or replaced)."""
+        keep = bisect.bisect_left(self.offsets, size)
+        if keep == len(self.offsets):
+            return
+        del self.timestamps[keep:]
+        del self.offsets[keep:]
+        with open(self.path, "wb") as f:
+            for ts, off in zip(self.timestamps, self.offsets):
+                f.write(_INDEX_RECORD.pack(ts, off))
+
+    def add(self, timestamp: float, offset: int, f) -> None:
+        f.write(_INDEX_RECORD.pack(timestamp, offset))
+        # Offsets before timestamps: a reader that sees the timestamp can use its offset.
+        self.offsets.append(offset)
+        self.timestamps.append(timestamp)
+
+
+class LogWriter:
+    def __init__(self, path: str, max_batch: int = 50, flush_interval: float = 1.0,
+                 time_key: str = "timestamp", archive_dir: str = "log_archive",
+                 rotate_bytes: int = 4 * 1024 * 1024, rotate_daily: bool = True,
+                 max_age_days: float = 180, max_total_bytes: int = 256 * 1024 * 1024,
+                 listeners: list = None) -> None:
+        self.path = path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.time_key = time_key
+        self.archive_dir = archive_dir
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        # Called on the writer thread with each batch once it is on disk.
+        self.listeners = listeners or []
+        # Held by readers and by rotation, which swaps the active file out from under them.
+        self._rotate_lock = threading.Lock()
+        self._last_ts = None
+        self.segments = self._load_segments()
+        self.index = LogIndex(path + ".idx")
+        self._since_index = self._catch_up_index()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{path}", daemon=True)
+        self._thread.start()
+
+    def _catch_up_index(self) -> int:
+        """Index any entries appended since the last index point (or the whole file once)."""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.index.truncate_after(size)
+        start = self.index.offsets[-1] if self.index.offsets else 0
+        since = 0
+        last_line = None
+        with open(self.index.path, "ab") as idx, open(self.path, "ab+") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn write from a crash; drop it so new entries start on a fresh line.
+                    f.truncate(offset)
+                    break
+                if line.strip():
+                    last_line = line
+                    if offset == start and self.index.offsets:
+                        since = 1
+                    elif not self.index.offsets or since >= INDEX_EVERY:
+                        self.index.add(json.loads(line)[self.time_key], offset, idx)
+                        since = 1
+                    else:
+                        since += 1
+                offset += len(line)
+        if last_line is not None:
+            self._last_ts = json.loads(last_line)[self.time_key]
+        return since
+
+    # ---------------------------
+    # Rotation & retention
+    # ---------------------------
+    def _segment_prefix(self) -> str:
+        return os.path.basename(self.path) + "."
+
+    def _load_segments(self) -> list:
+        os.makedirs(self.archive_dir, exist_ok=True)
+        segments = []
+        prefix = self._segment_prefix()
+        for name in os.listdir(self.archive_dir):
+            if name.startswith(prefix) and name.endswith(SEGMENT_SUFFIX):
+                segment = Segment.open_header(os.path.join(self.archive_dir, name))
+                if segment is not None:
+                    segments.append(segment)
+        segments.sort(key=lambda seg: seg.first)
+        return segments
+
+    def _rotation_due(self, next_ts: float) -> bool:
+        if not self.index.timestamps:
+            return False
+        if self._f.tell() >= self.rotate_bytes:
+            return True
+        if self.rotate_daily:
+            return time.localtime(self.index.timestamps[0])[:3] != time.localtime(next_ts)[:3]
+        return False
+
+    def _rotate(self) -> None:
+        with self._rotate_lock:
+            first, last = self.index.timestamps[0], self._last_ts
+            raw_bytes = os.path.getsize(self.path)
+            final = os.path.join(self.archive_dir, f"{self._segment_prefix()}{int(first * 1000)}{SEGMENT_SUFFIX}")
+            tmp = final + ".tmp"
+            with open(tmp, "wb") as out:
+                out.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, 1, first, last, raw_bytes))
+                with open(self.path, "rb") as src, gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+                    shutil.copyfileobj(src, gz, 256 * 1024)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, final)
+            self.segments.append(Segment(final, first, last, raw_bytes, os.path.getsize(final)))
+            self._f.close()
+            self._idx.close()
+            os.remove(self.path)
+            os.remove(self.index.path)
+            self.index = LogIndex(self.index.path)
+            self._since_index = 0
+            self._f = open(self.path, "ab")
+            self._idx = open(self.index.path, "ab")
+            self._apply_retention()
+        logger.info("Rotated log", path=self.path, segment=final, raw_bytes=raw_bytes)
+
+    def _apply_retention(self) -> None:
+        cutoff = time.time() - self.max_age_days * 86400
+        total = sum(seg.size for seg in self.segments)
+        while self.segments and (self.segments[0].last < cutoff or total > self.max_total_bytes):
+            old = self.segments.pop(0)
+            total -= old.size
+            try:
+                os.remove(old.path)
+            except FileNotFoundError:
+                pass
+
+    def write(self, entry: dict) -> None:
+        self._queue.put_nowait(entry)
+
+    def _flush(self, pending: list) -> None:
+        try:
+            if pending and self._rotation_due(pending[0][self.time_key]):
+                self._rotate()
+            offset = self._f.tell()
+            chunks = []
+            points = []
+            for entry in pending:
+                line = (json.dumps(entry) + "\n").encode("utf-8")
+                if (not self.index.offsets and not points) or self._since_index >= INDEX_EVERY:
+                    points.append((entry[self.time_key], offset))
+                    self._since_index = 0
+                self._since_index += 1
+                chunks.append(line)
+                offset += len(line)
+            self._f.write(b"".join(chunks))
+            self._f.flush()
+            if pending:
+                self._last_ts = pending[-1][self.time_key]
+            # Publish index points only once the lines they point at are on disk.
+            for ts, off in points:
+                self.index.add(ts, off, self._idx)
+            self._idx.flush()
+        except OSError as e:
+            logger.error("Log write failed", path=self.path, error=str(e), dropped=len(pending))
+            pending.clear()
+            return
+        for listener in self.listeners:
+            try:
+                listener(list(pending))
+            except Exception as e:
+                logger.error("Log listener failed", path=self.path, error=str(e))
+        pending.clear()
+
+    def _run(self) -> None:
+        pending = []
+        deadline = None
+        self._f = open(self.path, "ab")
+        self._idx = open(self.index.path, "ab")
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    self._flush(pending)
+                    return
+                if item is not None:
+                    if not pending:
+                        deadline = time.monotonic() + self.flush_interval
+                    pending.append(item)
+                if pending and (len(pending) >= self.max_batch or time.monotonic() >= deadline):
+                    self._flush(pending)
+                    deadline = None
+        finally:
+            self._f.close()
+            self._idx.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # ---------------------------
+    # Indexed reads
+    # ---------------------------
+    def _read_block(self, f, k: int, n: int, size: int) -> list:
+        start = self.index.offsets[k]
+        end = self.index.offsets[k + 1] if k + 1 < n else size
+        f.seek(start)
+        lines = f.read(end - start).split(b"\n")
+        # The last element is either empty or a line still being written.
+        return [line for line in lines[:-1] if line.strip()]
+
+    def _read_active(self, after, before, limit: int) -> list:
+        if not os.path.exists(self.path) or limit <= 0:
+            return []
+        n = len(self.index.timestamps)
+        if n == 0:
+            return []
+        size = os.path.getsize(self.path)
+        key = self.time_key
+        matches = lambda ts: (after is None or ts > after) and (before is None or ts < before)
+        out = []
+        with open(self.path, "rb") as f:
+            if after is not None:
+                k = max(bisect.bisect_right(self.index.timestamps, after, 0, n) - 1, 0)
+                while k < n and len(out) < limit:
+                    for line in self._read_block(f, k, n, size):
+                        ts = json.loads(line)[key]
+                        if before is not None and ts >= before:
+                            return out
+                        if matches(ts):
+                            out.append(line)
+                            if len(out) == limit:
+                                break
+                    k += 1
+                return out
+            k = n - 1 if before is None else bisect.bisect_left(self.index.timestamps, before, 0, n) - 1
+            while k >= 0 and len(out) < limit:
+                block = [line for line in self._read_block(f, k, n, size) if matches(json.loads(line)[key])]
+                out[:0] = block
+                k -= 1
+        return out[-limit:]
+
+    def iter_range(self, after: float = None, before: float = None):
+        """
+        Yield raw JSON lines with after < timestamp < before, oldest first,
+        opening only archive segments whose header range overlaps the period.
+        """
+        key = self.time_key
+        for segment in list(self.segments):
+            if not segment.overlaps(after, before):
+                continue
+            for line in segment.iter_lines():
+                ts = json.loads(line)[key]
+                if before is not None and ts >= before:
+                    return
+                if after is None or ts > after:
+                    yield line
+        cursor = float("-inf") if after is None else after
+        while True:
+            page = self._read_active(cursor, before, 500)
+            if not page:
+                return
+            yield from page
+            cursor = json.loads(page[-1])[key]
+
+    def iter_pages(self, after: float = None, before: float = None, page: int = 1000):
+        """
+        Like iter_range, but safe to run beside the writer thread: each page of
+        `page` lines is read under the rotate lock via read_window.
+        """
+        key = self.time_key
+        while True:
+            lines = self.read_window(after=float("-inf") if after is None else after, before=before, limit=page)
+            yield from lines
+            if len(lines) < page:
+                return
+            after = json.loads(lines[-1])[key]
+
+    def read_window(self, after: float = None, before: float = None, limit: int = 100) -> list:
+        """
+        Return up to `limit` raw JSON lines (bytes), oldest first, with
+        after < timestamp < before. Without `after`, the newest matching
+        entries are returned; with it, the oldest ones after that point.
+        Archived segments are consulted only when the active file runs short.
+        """
+        if limit <= 0:
+            return []
+        with self._rotate_lock:
+            if after is not None:
+                out = []
+                for line in self.iter_range(after, before):
+                    out.append(line)
+                    if len(out) == limit:
+                        break
+                return out
+            out = self._read_active(None, before, limit)
+            key = self.time_key
+            for segment in reversed(list(self.segments)):
+                if len(out) >= limit:
+                    break
+                if not segment.overlaps(None, before):
+                    continue
+                tail = deque(maxlen=limit - len(out))
+                for line in segment.iter_lines():
+                    if before is None or json.loads(line)[key] < before:
+                        tail.append(line)
+                out[:0] = list(tail)
+            return out[-limit:]
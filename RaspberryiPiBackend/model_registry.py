@@ -0,0 +1,137 @@
+"""
+Registry of TFLite models that are loaded once and hot-swapped on change.
+
+Publishers write a new model with publish_model(): bytes go to a temp file in
+the same directory, are fsynced, and are renamed over the live path, so a
+reader only ever sees the old file or the complete new one. A JSON stamp
+("<path>.json") carries the version and any metadata; it is keyed by the
+model's SHA-256 so a stamp that does not match the bytes is ignored. Metadata
+embedded in the model itself (tflite_export.py) is read first and the stamp
+is layered over it.
+
+Readers call registry.get(name). The file is stat()ed at most every
+`check_interval` seconds; when its inode, size or mtime changes the new bytes
+are loaded into a fresh interpreter and swapped in. Callers already holding
+the previous LoadedModel finish on it undisturbed.
+
+invoke() takes and returns float arrays in the model's scaled space; for
+full-int8 models the input is quantised and the output dequantised with the
+tensors' own (scale, zero_point).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import structlog
+import tflite_runtime.interpreter as tflite
+
+from tflite_export import quantize, dequantize, read_json_metadata
+
+logger = structlog.get_logger()
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def publish_model(path: str, content: bytes, metadata: dict = None) -> str:
+    """Atomically replace the model at `path`; returns the new version stamp."""
+    digest = hashlib.sha256(content).hexdigest()
+    version = time.strftime("%Y%m%dT%H%M%S") + "-" + digest[:8]
+    stamp = {"version": version, "sha256": digest, **(metadata or {})}
+    # Stamp first: until the model rename lands its digest won't match and it is ignored.
+    _atomic_write(path + ".json", json.dumps(stamp).encode("utf-8"))
+    _atomic_write(path, content)
+    return version
+
+
+class LoadedModel:
+    """One interpreter plus its version; invoke() is serialised per model."""
+
+    def __init__(self, name: str, path: str, content: bytes, stat_key: tuple) -> None:
+        self.name = name
+        self.path = path
+        self.stat_key = stat_key
+        digest = hashlib.sha256(content).hexdigest()
+        self.metadata = {**read_json_metadata(content), **self._read_stamp(path, digest)}
+        self.version = self.metadata.get("version", "sha256-" + digest[:8])
+        self.interpreter = tflite.Interpreter(model_content=content)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _read_stamp(path: str, digest: str) -> dict:
+        try:
+            with open(path + ".json", "r") as f:
+                stamp = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return stamp if stamp.get("sha256") == digest else {}
+
+    def invoke(self, input_data: np.ndarray) -> np.ndarray:
+        """Run one float batch; the input tensor is resized when the batch size changes."""
+        with self.lock:
+            index = self.input_details[0]['index']
+            if tuple(self.input_details[0]['shape']) != input_data.shape:
+                self.interpreter.resize_tensor_input(index, list(input_data.shape))
+                self.interpreter.allocate_tensors()
+                self.input_details = self.interpreter.get_input_details()
+                self.output_details = self.interpreter.get_output_details()
+            self.interpreter.set_tensor(index, quantize(input_data, self.input_details[0]))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_details[0]['index'])
+            return dequantize(output, self.output_details[0]).copy()
+
+
+class ModelRegistry:
+    def __init__(self, check_interval: float = 5.0) -> None:
+        self.check_interval = check_interval
+        self._paths = {}
+        self._models = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str) -> None:
+        with self._lock:
+            self._paths[name] = path
+            self._checked[name] = 0.0
+
+    def get(self, name: str) -> LoadedModel:
+        now = time.monotonic()
+        model = self._models.get(name)
+        if model is not None and now - self._checked[name] < self.check_interval:
+            return model
+        with self._lock:
+            self._checked[name] = now
+            path = self._paths[name]
+            st = os.stat(path)
+            stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            model = self._models.get(name)
+            if model is None or model.stat_key != stat_key:
+                with open(path, "rb") as f:
+                    content = f.read()
+                previous = model.version if model is not None else None
+                model = LoadedModel(name, path, content, stat_key)
+                self._models[name] = model
+                logger.info("Model loaded", model=name, version=model.version, previous=previous)
+            return model
+
+    def versions(self) -> dict:
+        return {name: model.version for name, model in self._models.items()}
@@ -0,0 +1,306 @@
+"""
+Nightly temperature-model retraining, run as a separate process by retraining.py.
+
+TensorFlow is only ever imported here. Progress is reported as one JSON
+object per line on stdout; the final line is one of
+{"event": "done", "artifact": ..., "metadata": {...}}, {"event": "rejected", ...},
+{"event": "skipped", ...} or {"event": "error", ...}. The worker writes the
+.tflite artifact to --out and never touches the live model; the server
+publishes it. The Keras model, replay buffer and state of an accepted run
+are written as "candidate" files next to the live ones, and the server
+promotes them with promote_candidate() only once the .tflite is published,
+so the next warm start always continues from the model being served.
+
+Training is incremental. The first run fits the scaler and trains from
+scratch on the whole log. Later runs load the previous Keras model and
+scaler range, read only the CSV bytes appended since the last accepted run,
+and fine-tune on those windows plus a fixed-size replay sample of older
+ones. The newest VAL_WINDOWS windows are held out: the candidate is
+accepted only if its MAE there is no worse than the previous model's (within
+GATE_TOLERANCE). Held-out rows are carried over and trained on next night.
+If new readings fall outside the recorded scaler range, the run becomes a
+cold start over the whole log with a refitted range (the previous model is
+still the gate's baseline, scored with its own range).
+
+The artifact is the full-int8 export from tflite_export.py, with the scaler
+range embedded; if quantisation costs more than tflite_export.INT8_TOLERANCE of MAE on the
+held-out windows the dynamic-range model is shipped instead.
+
+    python retrain_worker.py --csv temperature_log.csv --out temperature_model_new2.tflite.staging
+"""
+import argparse
+import json
+import os
+import sys
+
+from dataset import sliding_windows
+import tflite_export
+
+LOOKBACK, FORWARD = 5, 5
+VAL_WINDOWS = 48
+REPLAY_CAPACITY = 4096
+REPLAY_MIN = 256
+COLD_EPOCHS = 50
+WARM_EPOCHS = 10
+WARM_LEARNING_RATE = 1e-4
+GATE_TOLERANCE = 0.02
+
+
+def emit(event: str, **fields) -> None:
+    sys.stdout.write(json.dumps({"event": event, **fields}) + "\n")
+    sys.stdout.flush()
+
+
+def read_new_rows(csv_path: str, offset: int) -> tuple:
+    """Temperatures appended after byte `offset`; returns (temps, new_offset). Ignores a torn last line."""
+    with open(csv_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    temps = []
+    for line in data[:end].decode("utf-8").splitlines():
+        fields = line.split(",")
+        try:
+            temps.append(float(fields[1]))
+        except (IndexError, ValueError):
+            continue  # header or malformed row
+    return temps, offset + end
+
+
+class ReplayBuffer:
+    """Reservoir sample of past training windows, persisted as .npz."""
+
+    def __init__(self, path: str, seen: int = 0) -> None:
+        import numpy as np
+
+        self.path = path
+        self.seen = seen
+        self.X = np.empty((0, LOOKBACK, 1), dtype=np.float32)
+        self.y = np.empty((0, FORWARD, 1), dtype=np.float32)
+        if seen and os.path.exists(path):
+            with np.load(path) as data:
+                self.X, self.y = data["X"], data["y"]
+
+    def sample(self, count: int, rng):
+        count = min(count, len(self.X))
+        idx = rng.choice(len(self.X), size=count, replace=False)
+        return self.X[idx], self.y[idx]
+
+    def extend(self, X, y, rng) -> None:
+        import numpy as np
+
+        keep_X, keep_y = list(self.X), list(self.y)
+        for xi, yi in zip(X, y):
+            self.seen += 1
+            if len(keep_X) < REPLAY_CAPACITY:
+                keep_X.append(xi)
+                keep_y.append(yi)
+            else:
+                j = rng.integers(0, self.seen)
+                if j < REPLAY_CAPACITY:
+                    keep_X[j], keep_y[j] = xi, yi
+        self.X = np.asarray(keep_X, dtype=np.float32).reshape(-1, LOOKBACK, 1)
+        self.y = np.asarray(keep_y, dtype=np.float32).reshape(-1, FORWARD, 1)
+
+    def save(self, path: str = None) -> None:
+        import numpy as np
+
+        path = path or self.path
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, X=self.X, y=self.y)
+        os.replace(tmp, path)
+
+
+def build_model(lookback: int = LOOKBACK, forward: int = FORWARD, filters: int = 32, kernel_size: int = 2,
+                dense: int = 64, dropout: float = 0.2, learning_rate: float = 1e-3):
+    """The Conv1D forecaster; the defaults are the shipped architecture (see hpsearch.py)."""
+    import tensorflow as tf
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv1D, Dropout, Flatten, Dense, Reshape
+
+    model = Sequential([
+        Conv1D(filters, kernel_size=kernel_size, activation="relu", input_shape=(lookback, 1)),
+        Dropout(dropout),
+        Flatten(),
+        Dense(dense, activation="relu"),
+        Dense(forward),
+        Reshape((forward, 1))
+    ])
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate), loss="mse", metrics=["mae"])
+    return model
+
+
+def _load_state(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path: str, state: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def candidate_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.candidate{ext}"
+
+
+def _persisted(h5_path: str) -> list:
+    # Promotion order: the state file (with the CSV offset) goes last and commits the run.
+    return [h5_path, h5_path + ".replay.npz", h5_path + ".state.json"]
+
+
+def promote_candidate(h5_path: str) -> None:
+    """Replace the live Keras model, replay buffer and state with the accepted run's candidates."""
+    for path in _persisted(h5_path):
+        if os.path.exists(candidate_path(path)):
+            os.replace(candidate_path(path), path)
+
+
+def discard_candidate(h5_path: str) -> None:
+    for path in _persisted(h5_path):
+        if os.path.exists(candidate_path(path)):
+            os.remove(candidate_path(path))
+
+
+def _mae_celsius(model, X, y, scale_min: float, scale_max: float) -> float:
+    """MAE of `model` in degrees on unscaled windows, using the range it was trained with."""
+    import numpy as np
+
+    scale = (scale_max - scale_min) or 1.0
+    return float(np.abs(model.predict((X - scale_min) / scale, verbose=0) - (y - scale_min) / scale).mean()) * scale
+
+
+def train(csv_path: str, out_path: str, h5_path: str, epochs: int = None) -> tuple:
+    """Returns (event, fields) for the final progress line."""
+    import numpy as np
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping, LambdaCallback
+
+    state_path = h5_path + ".state.json"
+    replay_path = h5_path + ".replay.npz"
+    discard_candidate(h5_path)
+    state = _load_state(state_path) if os.path.exists(h5_path) else {}
+    previous = dict(state)
+    rng = np.random.default_rng()
+
+    new_temps, new_offset = read_new_rows(csv_path, state.get("offset", 0))
+    if state and new_temps and not state["scale_min"] <= min(new_temps) <= max(new_temps) <= state["scale_max"]:
+        # Scaled inputs outside [0, 1] would be extrapolated: refit the range on the whole log.
+        emit("cold_start", reason="outside scaler range", new_min=min(new_temps), new_max=max(new_temps),
+             scale_min=state["scale_min"], scale_max=state["scale_max"])
+        state = {}
+        new_temps, new_offset = read_new_rows(csv_path, 0)
+    warm = bool(state)
+    series = np.asarray(state.get("pending", []) + new_temps, dtype=np.float32)
+    if warm:
+        scale_min, scale_max = state["scale_min"], state["scale_max"]
+    else:
+        if len(series) == 0:
+            return "skipped", {"reason": "empty log"}
+        scale_min, scale_max = float(series.min()), float(series.max())
+    scale = (scale_max - scale_min) or 1.0
+
+    raw_X, raw_y = sliding_windows(series, LOOKBACK, FORWARD)
+    X, y = (raw_X - scale_min) / scale, (raw_y - scale_min) / scale
+    if len(X) <= VAL_WINDOWS:
+        return "skipped", {"reason": "not enough new data", "new_rows": len(new_temps)}
+    X_train, y_train = X[:-VAL_WINDOWS], y[:-VAL_WINDOWS]
+    X_val, y_val = X[-VAL_WINDOWS:], y[-VAL_WINDOWS:]
+
+    baseline_mae = None
+    if previous:
+        # The served model, scored in degrees with its own range (it differs after a forced cold start).
+        served = tf.keras.models.load_model(h5_path, compile=False)
+        baseline_mae = _mae_celsius(served, raw_X[-VAL_WINDOWS:], raw_y[-VAL_WINDOWS:],
+                                    previous["scale_min"], previous["scale_max"])
+    replay = ReplayBuffer(replay_path, state.get("replay_seen", 0))
+    if warm:
+        X_old, y_old = replay.sample(max(REPLAY_MIN, len(X_train)), rng)
+        X_fit = np.concatenate([X_train, X_old])
+        y_fit = np.concatenate([y_train, y_old])
+        model = served
+        model.compile(optimizer=tf.keras.optimizers.Adam(WARM_LEARNING_RATE), loss="mse", metrics=["mae"])
+        epochs = epochs or WARM_EPOCHS
+    else:
+        X_fit, y_fit = X_train, y_train
+        model = build_model()
+        epochs = epochs or COLD_EPOCHS
+    emit("loaded", warm=warm, new_rows=len(new_temps), train_windows=len(X_train),
+         replay_windows=len(X_fit) - len(X_train), val_windows=len(X_val))
+
+    es = EarlyStopping(monitor="val_loss", patience=5 if not warm else 3, restore_best_weights=True)
+    progress = LambdaCallback(on_epoch_end=lambda epoch, logs: emit(
+        "epoch", epoch=epoch + 1, epochs=epochs,
+        loss=float(logs.get("loss", 0.0)), val_loss=float(logs.get("val_loss", 0.0)),
+    ))
+    model.fit(
+        X_fit, y_fit,
+        validation_data=(X_val, y_val),
+        epochs=epochs,
+        batch_size=32,
+        shuffle=True,
+        callbacks=[es, progress],
+        verbose=0
+    )
+    val_mae = float(np.abs(model.predict(X_val, verbose=0) - y_val).mean()) * scale
+
+    if baseline_mae is not None and val_mae > baseline_mae * (1 + GATE_TOLERANCE):
+        return "rejected", {"val_mae": val_mae, "baseline_mae": baseline_mae}
+
+    scaling = {"scale_min": scale_min, "scale_max": scale_max, "units": "celsius",
+               "lookback": LOOKBACK, "forward": FORWARD}
+    content, export_report = tflite_export.export(model, X_fit, X_val, y_val, scaling)
+    emit("exported", **export_report)
+    with open(out_path, "wb") as f:
+        f.write(content)
+
+    # Candidates only: the server promotes them after publishing the .tflite.
+    if os.path.dirname(h5_path):
+        os.makedirs(os.path.dirname(h5_path), exist_ok=True)
+    model.save(candidate_path(h5_path))
+    # Held-out rows (and the overlap needed to window them) are trained on next run.
+    carry = VAL_WINDOWS + LOOKBACK + FORWARD - 1
+    replay.extend(X_train, y_train, rng)
+    replay.save(candidate_path(replay_path))
+    _save_state(candidate_path(state_path), {
+        "offset": new_offset,
+        "pending": series[-carry:].tolist(),
+        "scale_min": scale_min,
+        "scale_max": scale_max,
+        "replay_seen": replay.seen,
+        "val_mae": val_mae,
+    })
+
+    return "done", {"artifact": out_path, "metadata": {
+        **scaling,
+        "quantization": export_report["quantization"],
+        "warm_start": warm,
+        "val_mae": val_mae,
+        "baseline_mae": baseline_mae,
+    }}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Retrain the temperature forecaster")
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--h5", default="prediction_model_temp.h5")
+    parser.add_argument("--epochs", type=int, default=None)
+    args = parser.parse_args(argv)
+    try:
+        event, fields = train(args.csv, args.out, args.h5, args.epochs)
+    except Exception as e:
+        emit("error", error=f"{type(e).__name__}: {e}")
+        return 1
+    emit(event, **fields)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Launches retrain_worker.py as a low-priority child process.
+
+The child runs under nice(19), the idle I/O class and a CPU affinity mask
+that by default leaves core 0 to the API, voice loop and controllers. All
+three are applied by wrapping the command (`nice -n`, `ionice -c 3`,
+`taskset -c`) rather than a preexec_fn, which is not safe to run in this
+multithreaded process. Thread pools inside the child are capped
+to the cores it is allowed. A watchdog kills it after `timeout` seconds.
+Only the .tflite artifact it writes is taken back and published; a run the
+worker's validation gate rejects (or skips for lack of new data) leaves the
+live model in place. The worker's Keras model and training state are
+promoted only after a successful publish, and discarded otherwise.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import structlog
+
+from model_registry import publish_model
+from retrain_worker import discard_candidate, promote_candidate
+
+logger = structlog.get_logger()
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrain_worker.py")
+
+
+def default_cpus() -> list:
+    cpus = sorted(os.sched_getaffinity(0))
+    return cpus[1:] or cpus
+
+
+class RetrainJob:
+    def __init__(self, csv_path: str, model_path: str, h5_path: str, timeout: float = 3600,
+                 niceness: int = 19, idle_io: bool = True, cpus: list = None,
+                 log_path: str = "retrain_worker.log") -> None:
+        self.csv_path = os.path.abspath(csv_path)
+        self.model_path = os.path.abspath(model_path)
+        self.h5_path = os.path.abspath(h5_path)
+        self.timeout = timeout
+        self.niceness = niceness
+        self.idle_io = idle_io
+        self.cpus = cpus
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.status = {"state": "idle"}
+
+    def _command(self, staging: str, cpus: list) -> list:
+        cmd = [sys.executable, WORKER, "--csv", self.csv_path, "--out", staging, "--h5", self.h5_path]
+        if shutil.which("taskset"):
+            cmd = ["taskset", "-c", ",".join(str(cpu) for cpu in cpus)] + cmd
+        if self.idle_io and shutil.which("ionice"):
+            cmd = ["ionice", "-c", "3"] + cmd
+        if self.niceness and shutil.which("nice"):
+            cmd = ["nice", "-n", str(self.niceness)] + cmd
+        return cmd
+
+    def _environment(self, cpus: list) -> dict:
+        threads = str(len(cpus))
+        return dict(
+            os.environ,
+            OMP_NUM_THREADS=threads,
+            TF_NUM_INTRAOP_THREADS=threads,
+            TF_NUM_INTEROP_THREADS="1",
+            TF_CPP_MIN_LOG_LEVEL="2",
+        )
+
+    def run(self):
+        """Run one retrain to completion; returns the published version or None."""
+        if not self._lock.acquire(blocking=False):
+            logger.warning("Retrain already running; skipping")
+            return None
+        try:
+            return self._run()
+        finally:
+            self._lock.release()
+
+    def _run(self):
+        if not os.path.exists(self.csv_path):
+            logger.warning("No temperature log found; skipping retrain.")
+            return None
+        cpus = self.cpus or default_cpus()
+        staging = self.model_path + ".staging"
+        started = time.time()
+        self.status = {"state": "running", "started": started, "cpus": cpus}
+        with open(self.log_path, "ab") as stderr:
+            proc = subprocess.Popen(
+                self._command(staging, cpus), stdout=subprocess.PIPE, stderr=stderr, text=True,
+                env=self._environment(cpus),
+            )
+            watchdog = threading.Timer(self.timeout, proc.kill)
+            watchdog.start()
+            result = None
+            try:
+                for line in proc.stdout:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.status = {**self.status, **message, "state": "running"}
+                    if message.get("event") == "epoch":
+                        logger.debug("Retrain progress", epoch=message["epoch"], val_loss=message["val_loss"])
+                    elif message.get("event") == "exported":
+                        logger.info("Retrained model exported", quantization=message["quantization"],
+                                    int8=message["int8"], dynamic=message["dynamic"])
+                    elif message.get("event") in ("done", "rejected", "skipped", "error"):
+                        result = message
+                returncode = proc.wait()
+            finally:
+                watchdog.cancel()
+
+        elapsed = round(time.time() - started, 1)
+        if result is not None and result.get("event") in ("rejected", "skipped") and returncode == 0:
+            fields = {k: v for k, v in result.items() if k != "event"}
+            self.status = {"state": result["event"], "elapsed_s": elapsed, **fields}
+            logger.info("Retrain kept previous model", outcome=result["event"], elapsed_s=elapsed, **fields)
+            discard_candidate(self.h5_path)
+            return None
+        if result is None or result.get("event") != "done" or returncode != 0:
+            error = (result or {}).get("error") or f"worker exited with {returncode}"
+            if returncode == -9:
+                error = f"timed out after {self.timeout}s"
+            self.status = {"state": "failed", "error": error, "elapsed_s": elapsed}
+            logger.error("Retrain failed", error=error, elapsed_s=elapsed)
+            if os.path.exists(staging):
+                os.remove(staging)
+            discard_candidate(self.h5_path)
+            return None
+
+        with open(staging, "rb") as f:
+            content = f.read()
+        os.remove(staging)
+        try:
+            version = publish_model(self.model_path, content, result["metadata"])
+        except Exception:
+            discard_candidate(self.h5_path)
+            raise
+        # The worker's Keras model and state now match the served model; the next run continues from it.
+        promote_candidate(self.h5_path)
+        self.status = {"state": "succeeded", "version": version, "elapsed_s": elapsed, **result["metadata"]}
+        logger.info("Saved retrained TFLite model", path=self.model_path, version=version, elapsed_s=elapsed)
+        return version
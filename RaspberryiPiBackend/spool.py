@@ -0,0 +1,212 @@
+"""
+Disk-backed store-and-forward queue for telemetry payloads.
+
+Payloads are appended to numbered segment files as length + CRC framed
+records. A small checkpoint file records the read position (segment, offset)
+and is replaced atomically, so after a crash or power cut the queue resumes
+from the last acknowledged record. A torn record at the tail is truncated
+on open.
+
+peek() returns a Record carrying the position it was read from; ack() only
+advances if that is still the read position, so an ack that raced with the
+oldest segment being dropped (full spool) is ignored instead of moving the
+read offset into the middle of a record.
+"""
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import namedtuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+_HEADER = struct.Struct("<II")  # payload length, crc32
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint.json"
+
+DROP_OLDEST = "oldest"
+DROP_NEWEST = "newest"
+
+Record = namedtuple("Record", ["segment", "offset", "payload"])
+
+
+class DiskQueue:
+    """
+    Bounded FIFO of byte payloads persisted under `directory`.
+    When the queue would exceed max_bytes, `drop_policy` decides whether
+    the oldest segment is discarded or the new payload is rejected;
+    `dropped` counts the payloads lost either way.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 256 * 1024,
+                 max_bytes: int = 32 * 1024 * 1024, drop_policy: str = DROP_OLDEST) -> None:
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        if not self._segments:
+            self._segments = [0]
+            open(self._path(0), "ab").close()
+        self._repair_tail()
+        self._read_seg, self._read_off = self._load_checkpoint()
+
+    # ---------------------------
+    # Files & checkpoint
+    # ---------------------------
+    def _path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seg:010d}{SEGMENT_SUFFIX}")
+
+    def _repair_tail(self) -> None:
+        path = self._path(self._segments[-1])
+        good = 0
+        with open(path, "rb") as f:
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    break
+                good = f.tell()
+        if good != os.path.getsize(path):
+            logger.warning("Truncating torn spool record", path=path, offset=good)
+            with open(path, "r+b") as f:
+                f.truncate(good)
+
+    def _load_checkpoint(self) -> tuple:
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                cp = json.load(f)
+            seg, off = cp["segment"], cp["offset"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return self._segments[0], 0
+        if seg not in self._segments:
+            return self._segments[0], 0
+        # Segments before the checkpoint were consumed but not yet deleted.
+        for stale in [s for s in self._segments if s < seg]:
+            self._segments.remove(stale)
+            os.remove(self._path(stale))
+        return seg, off
+
+    def _save_checkpoint(self) -> None:
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": self._read_seg, "offset": self._read_off}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read_record(f):
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        length, crc = _HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def _size(self) -> int:
+        total = sum(os.path.getsize(self._path(seg)) for seg in self._segments)
+        return total - self._read_off
+
+    def _drop_oldest_segment(self):
+        """Discard the segment being read; returns the number of unread payloads lost, or None if it is the only one."""
+        if len(self._segments) < 2:
+            return None
+        seg = self._segments.pop(0)
+        lost = 0
+        with open(self._path(seg), "rb") as f:
+            f.seek(self._read_off)
+            while self._read_record(f) is not None:
+                lost += 1
+        os.remove(self._path(seg))
+        self._read_seg, self._read_off = self._segments[0], 0
+        self._save_checkpoint()
+        return lost
+
+    # ---------------------------
+    # Queue operations
+    # ---------------------------
+    def put(self, payload: bytes) -> bool:
+        """Append a payload durably. Returns False if it was dropped by policy."""
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            while self._size() + len(record) > self.max_bytes:
+                lost = self._drop_oldest_segment() if self.drop_policy == DROP_OLDEST else None
+                if lost is None:
+                    self.dropped += 1
+                    logger.warning("Spool full; dropping payload", policy=self.drop_policy)
+                    return False
+                self.dropped += lost
+                logger.warning("Spool full; dropped oldest segment", payloads=lost)
+            tail = self._segments[-1]
+            if os.path.getsize(self._path(tail)) >= self.segment_bytes:
+                tail += 1
+                self._segments.append(tail)
+            with open(self._path(tail), "ab") as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def peek(self):
+        """Return the oldest unacknowledged payload as a Record, or None if the queue is empty."""
+        with self._lock:
+            while True:
+                with open(self._path(self._read_seg), "rb") as f:
+                    f.seek(self._read_off)
+                    payload = self._read_record(f)
+                if payload is not None:
+                    return Record(self._read_seg, self._read_off, payload)
+                if self._read_seg == self._segments[-1]:
+                    return None
+                # Current segment fully consumed; move on and reclaim it.
+                self._segments.remove(self._read_seg)
+                os.remove(self._path(self._read_seg))
+                self._read_seg, self._read_off = self._segments[0], 0
+                self._save_checkpoint()
+
+    def ack(self, record: Record) -> bool:
+        """
+        Mark the Record returned by peek() as delivered. Returns False, and changes
+        nothing, if the record is no longer at the read position (its segment was dropped).
+        """
+        with self._lock:
+            if (record.segment, record.offset) != (self._read_seg, self._read_off):
+                logger.warning("Ignoring stale spool ack", segment=record.segment, offset=record.offset)
+                return False
+            self._read_off += _HEADER.size + len(record.payload)
+            self._save_checkpoint()
+            return True
+
+    def pending_bytes(self) -> int:
+        """Bytes not yet acknowledged, including framing; cheap, unlike len()."""
+        with self._lock:
+            return self._size()
+
+    def __len__(self) -> int:
+        count = 0
+        with self._lock:
+            for seg in self._segments:
+                if seg < self._read_seg:
+                    continue
+                with open(self._path(seg), "rb") as f:
+                    if seg == self._read_seg:
+                        f.seek(self._read_off)
+                    while self._read_record(f) is not None:
+                        count += 1
+        return count
@@ -0,0 +1,92 @@
+"""
+Local stand-ins for Azure IoT Hub, for exercising the edge code without a live service.
+"""
+import asyncio
+import threading
+import time
+
+
+class LoopbackBroker:
+    """
+    Minimal device-client stand-in that records what it receives.
+    Set `online = False`, or schedule outages with fail_next(n), to simulate
+    a dropped uplink; send_message() then raises ConnectionError like the SDK.
+    """
+
+    def __init__(self) -> None:
+        self.online = True
+        self.received = []
+        self._fail_budget = 0
+        self._lock = threading.Lock()
+
+    def fail_next(self, count: int) -> None:
+        with self._lock:
+            self._fail_budget += count
+
+    def connect(self) -> None:
+        if not self.online:
+            raise ConnectionError("Stand-in broker is offline")
+
+    def disconnect(self) -> None:
+        pass
+
+    def send_message(self, message) -> None:
+        with self._lock:
+            if not self.online:
+                raise ConnectionError("Stand-in broker is offline")
+            if self._fail_budget > 0:
+                self._fail_budget -= 1
+                raise ConnectionError("Stand-in broker dropped the connection")
+            data = getattr(message, "data", message)
+            self.received.append((time.time(), data))
+
+
+class StandinMethodRequest:
+    """Shape-compatible with azure.iot.device.MethodRequest."""
+
+    def __init__(self, request_id: str, name: str, payload) -> None:
+        self.request_id = request_id
+        self.name = name
+        self.payload = payload
+
+
+class AsyncLoopbackBroker(LoopbackBroker):
+    """
+    Asyncio variant for code written against azure.iot.device.aio.
+    invoke_method() plays the cloud side of a direct method call and returns
+    (status, payload, round_trip_ms).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.on_method_request_received = None
+        self._pending = {}
+        self._next_id = 0
+
+    async def connect(self) -> None:
+        LoopbackBroker.connect(self)
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def send_message(self, message) -> None:
+        LoopbackBroker.send_message(self, message)
+
+    async def send_method_response(self, response) -> None:
+        future = self._pending.pop(response.request_id, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    async def invoke_method(self, name: str, payload=None, timeout: float = 10.0) -> tuple:
+        if not self.online:
+            raise ConnectionError("Stand-in broker is offline")
+        if self.on_method_request_received is None:
+            raise RuntimeError("No direct method handler attached")
+        self._next_id += 1
+        request_id = str(self._next_id)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        started = time.perf_counter()
+        await self.on_method_request_received(StandinMethodRequest(request_id, name, payload))
+        response = await asyncio.wait_for(future, timeout)
+        return response.status, response.payload, (time.perf_counter() - started) * 1000.0
@@ -0,0 +1,105 @@
+"""
+Batched, compressed telemetry for Azure IoT Hub.
+
+Readings are collected in memory and flushed as one gzip-compressed JSON
+message when the batch is full, too old, or a watched value moves by more
+than its threshold. The body is columnar (field names sent once per batch)
+so per-reading overhead stays small even before compression.
+"""
+import gzip
+import json
+import time
+
+BATCH_CONTENT_TYPE = "application/json"
+BATCH_CONTENT_ENCODING = "gzip"
+BATCH_SCHEMA_VERSION = 1
+
+# Field -> minimum change that forces an early flush. 0 means any change.
+DEFAULT_THRESHOLDS = {
+    "Temperature": 0.5,
+    "Humidity": 3.0,
+    "AirQuality": 0,
+    "Motion": 0,
+}
+
+
+def encode_batch(readings: list) -> bytes:
+    """Pack a list of reading dicts into a compressed columnar payload."""
+    fields = []
+    for reading in readings:
+        for key in reading:
+            if key not in fields:
+                fields.append(key)
+    body = {
+        "v": BATCH_SCHEMA_VERSION,
+        "fields": fields,
+        "rows": [[reading.get(key) for key in fields] for reading in readings],
+    }
+    raw = json.dumps(body, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(raw, compresslevel=9)
+
+
+def decode_batch(payload: bytes) -> list:
+    """Inverse of encode_batch, for the cloud side and for local checks."""
+    body = json.loads(gzip.decompress(payload).decode("utf-8"))
+    fields = body["fields"]
+    return [dict(zip(fields, row)) for row in body["rows"]]
+
+
+class TelemetryBatcher:
+    """
+    Collects readings and decides when a batch is due.
+    add() returns True once a flush is due; drain() returns the encoded batch.
+    """
+
+    def __init__(self, max_readings: int = 12, max_age: float = 60.0, thresholds: dict = None) -> None:
+        self.max_readings = max_readings
+        self.max_age = max_age
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self._readings = []
+        self._opened_at = None
+        self._reference = {}
+
+    def __len__(self) -> int:
+        return len(self._readings)
+
+    def _significant(self, reading: dict) -> bool:
+        for key, threshold in self.thresholds.items():
+            if key not in reading or key not in self._reference:
+                continue
+            new, old = reading[key], self._reference[key]
+            if new == old:
+                continue
+            if isinstance(new, (int, float)) and isinstance(old, (int, float)) and not isinstance(new, bool):
+                if abs(new - old) >= threshold:
+                    return True
+            else:
+                return True
+        return False
+
+    def add(self, reading: dict, urgent: bool = False) -> bool:
+        if not self._readings:
+            self._opened_at = time.monotonic()
+        self._readings.append(reading)
+        if not self._reference:
+            self._reference = dict(reading)
+        return urgent or self.due(reading)
+
+    def due(self, reading: dict = None) -> bool:
+        if not self._readings:
+            return False
+        if len(self._readings) >= self.max_readings:
+            return True
+        if time.monotonic() - self._opened_at >= self.max_age:
+            return True
+        return reading is not None and self._significant(reading)
+
+    def drain(self) -> bytes:
+        """Encode and clear the pending batch. Returns None if it is empty."""
+        if not self._readings:
+            return None
+        payload = encode_batch(self._readings)
+        self._reference = dict(self._readings[-1])
+        self._readings = []
+        self._opened_at = None
+        return payload
@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pigpio")
+from dht22 import decode_edges  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "dht22_frame.json")
+
+
+@pytest.fixture
+def frame():
+    # Edges as pigpio delivers them: host release, 80us preamble, 40 data bits,
+    # with jitter on every pulse and ticks that wrap past 2**32 mid-frame.
+    with open(FIXTURE) as f:
+        recorded = json.load(f)
+    recorded["edges"] = [tuple(edge) for edge in recorded["edges"]]
+    return recorded
+
+
+def test_decodes_recorded_frame(frame):
+    temperature, humidity = decode_edges(frame["edges"])
+    assert temperature == pytest.approx(frame["temperature"])
+    assert humidity == pytest.approx(frame["humidity"])
+    assert sum(frame["raw"][:4]) & 0xFF == frame["raw"][4]
+
+
+def test_rejects_bad_checksum(frame):
+    edges = list(frame["edges"])
+    # Flip the last checksum bit by changing its high pulse width; the other bytes are untouched.
+    rise = edges[-3][1]
+    width = 26 if frame["raw"][4] & 1 else 70
+    edges[-2] = (0, (rise + width) & 0xFFFFFFFF)
+    with pytest.raises(ValueError, match="checksum"):
+        decode_edges(edges)
+
+
+def test_rejects_short_frame(frame):
+    with pytest.raises(ValueError, match="Short DHT22 frame"):
+        decode_edges(frame["edges"][:-20])
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("azure.iot.device")
+from commands import CommandRouter  # noqa: E402
+from iot_client import run_forwarder  # noqa: E402
+from spool import DiskQueue  # noqa: E402
+from standin import AsyncLoopbackBroker  # noqa: E402
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached before timeout")
+        await asyncio.sleep(0.01)
+
+
+def test_forwarder_survives_outage_and_acks_after_send(tmp_path):
+    queue = DiskQueue(str(tmp_path))
+    payloads = [b"batch-%d" % i for i in range(5)]
+    for payload in payloads:
+        queue.put(payload)
+    broker = AsyncLoopbackBroker()
+    connects = []
+
+    async def connect():
+        connects.append(broker.online)
+        await broker.connect()
+        return broker
+
+    async def scenario():
+        broker.online = False
+        forwarder = asyncio.create_task(
+            run_forwarder(queue, connect, make_message=lambda payload: payload, max_rate=0, idle_interval=0.01))
+        try:
+            await asyncio.sleep(0.1)
+            # Offline: nothing sent, nothing acknowledged.
+            assert broker.received == []
+            assert len(queue) == len(payloads)
+            broker.online = True
+            # The first send after reconnecting drops; that payload must stay spooled and go out next.
+            broker.fail_next(1)
+            await _wait_for(lambda: len(broker.received) == len(payloads))
+            await _wait_for(lambda: len(queue) == 0)
+        finally:
+            forwarder.cancel()
+
+    asyncio.run(scenario())
+    assert [data for _, data in broker.received] == payloads
+    assert connects[0] is False and connects[-1] is True
+    assert len(connects) >= 3
+    # A reopened spool resumes from the checkpoint: everything was acknowledged.
+    assert DiskQueue(str(tmp_path)).peek() is None
+
+
+def test_direct_methods_always_get_a_response():
+    router = CommandRouter()
+
+    def set_fan(payload):
+        return {"fan": payload["state"]}
+
+    def set_display(payload):
+        raise RuntimeError("pigpio daemon not running")
+
+    router.add("setFan", set_fan)
+    router.add("setDisplay", set_display)
+    broker = AsyncLoopbackBroker()
+    router.bind(broker)
+
+    async def scenario():
+        return [
+            await broker.invoke_method("setFan", {"state": "on", "sent_at": "not-a-time"}, timeout=2),
+            await broker.invoke_method("setFan", {}, timeout=2),
+            await broker.invoke_method("reboot", {}, timeout=2),
+            await broker.invoke_method("setDisplay", {}, timeout=2),
+        ]
+
+    ok, bad, unknown, broken = asyncio.run(scenario())
+    assert ok[0] == 200 and ok[1]["result"] == {"fan": "on"}
+    assert bad[0] == 400 and not bad[1]["ok"]
+    assert unknown[0] == 404 and "reboot" in unknown[1]["error"]
+    assert broken[0] == 500 and "pigpio" in broken[1]["error"]
+    assert router.handled == 1 and router.failed == 3
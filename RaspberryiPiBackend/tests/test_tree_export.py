@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+xgb = pytest.importorskip("xgboost")
+pytest.importorskip("sklearn")
+from sklearn.multioutput import MultiOutputRegressor  # noqa: E402
+from sklearn.preprocessing import StandardScaler  # noqa: E402
+
+from tree_export import TreeEnsemble, export_boosters  # noqa: E402
+
+N_PAST, N_FUTURE, CHANNELS = 6, 3, 2
+
+
+def test_packed_ensemble_matches_xgboost(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(20.0, 5.0, size=(400, CHANNELS * N_PAST))
+    y = X[:, -CHANNELS * N_FUTURE:] * 0.8 + rng.normal(0.0, 0.5, size=(400, CHANNELS * N_FUTURE))
+    scaler_X, scaler_y = StandardScaler().fit(X), StandardScaler().fit(y)
+    model = MultiOutputRegressor(xgb.XGBRegressor(n_estimators=25, max_depth=4, learning_rate=0.3))
+    model.fit(scaler_X.transform(X), scaler_y.transform(y))
+
+    path = str(tmp_path / "trees.npz")
+    export_boosters([estimator.get_booster() for estimator in model.estimators_], scaler_X, scaler_y,
+                    {"n_past": N_PAST, "n_future": N_FUTURE}, path)
+    ensemble = TreeEnsemble(path)
+
+    X_test = rng.normal(20.0, 6.0, size=(200, CHANNELS * N_PAST))
+    # Missing values must follow each split's default direction, as in XGBoost.
+    X_test[rng.random(X_test.shape) < 0.05] = np.nan
+    reference = scaler_y.inverse_transform(model.predict(scaler_X.transform(X_test)))
+    assert np.abs(ensemble.predict(X_test) - reference).max() < 1e-3
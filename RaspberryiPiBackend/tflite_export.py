@@ -0,0 +1,272 @@
+"""
+Full-integer TFLite export for the Conv1D temperature forecaster.
+
+The Keras model is converted twice: the dynamic-range model the project
+used to ship (Optimize.DEFAULT, float I/O) and a full-int8 model
+calibrated on a representative sample of training windows, with int8
+input and output tensors. Both are scored on held-out windows in °C; the
+int8 model is rejected, and the dynamic-range one kept, when its MAE is
+more than `tolerance` (relative) worse. The MinMax scaling the model was
+trained with is embedded in the flatbuffer's metadata table under
+METADATA_NAME, so a model file is self-describing even without its
+publish_model() stamp.
+
+Serving code needs only quantize()/dequantize() and read_metadata() from
+here; TensorFlow is imported lazily by the export functions.
+
+    python tflite_export.py export --h5 models/prediction_model_temp.h5 --csv hourly_interpolated_data.csv --out models/temperature_model_pi.tflite
+    python tflite_export.py bench models/temperature_model_pi.tflite ../Backend/temperature_model_pi.tflite
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+METADATA_NAME = "smartaura"
+CALIBRATION_WINDOWS = 256
+INT8_TOLERANCE = 0.05
+LATENCY_REPEAT = 200
+
+
+def interpreter(model_path: str = None, model_content: bytes = None):
+    try:
+        import tflite_runtime.interpreter as tflite
+    except ImportError:
+        try:
+            import ai_edge_litert.interpreter as tflite
+        except ImportError:
+            import tensorflow.lite as tflite
+    result = tflite.Interpreter(model_path=model_path, model_content=model_content)
+    result.allocate_tensors()
+    return result
+
+
+def quantize(values: np.ndarray, detail: dict) -> np.ndarray:
+    """Float values -> the tensor's dtype, using its (scale, zero_point) when it is integer."""
+    dtype = np.dtype(detail["dtype"])
+    if dtype.kind == "f":
+        return np.asarray(values, dtype=dtype)
+    scale, zero_point = detail["quantization"]
+    info = np.iinfo(dtype)
+    return np.clip(np.round(np.asarray(values) / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def dequantize(values: np.ndarray, detail: dict) -> np.ndarray:
+    if np.dtype(detail["dtype"]).kind == "f":
+        return values
+    scale, zero_point = detail["quantization"]
+    return (values.astype(np.float32) - zero_point) * np.float32(scale)
+
+
+def run(model, X: np.ndarray) -> np.ndarray:
+    """Scaled float windows (N, lookback, 1) -> scaled float predictions, for any I/O type."""
+    index = model.get_input_details()[0]["index"]
+    if tuple(model.get_input_details()[0]["shape"]) != X.shape:
+        model.resize_tensor_input(index, list(X.shape))
+        model.allocate_tensors()
+    model.set_tensor(index, quantize(X, model.get_input_details()[0]))
+    model.invoke()
+    detail = model.get_output_details()[0]
+    return dequantize(model.get_tensor(detail["index"]), detail)
+
+
+# --- flatbuffer metadata ---------------------------------------------------
+
+def _table_field(buf: bytes, table: int, field: int):
+    """Absolute position of `field` in the flatbuffer table at `table`, or None if absent."""
+    vtable = table - struct.unpack_from("<i", buf, table)[0]
+    vtable_size = struct.unpack_from("<H", buf, vtable)[0]
+    entry = 4 + 2 * field
+    if entry >= vtable_size:
+        return None
+    offset = struct.unpack_from("<H", buf, vtable + entry)[0]
+    return table + offset if offset else None
+
+
+def _vector(buf: bytes, position: int) -> tuple:
+    """(start, length) of the vector referenced at `position`."""
+    start = position + struct.unpack_from("<I", buf, position)[0]
+    return start + 4, struct.unpack_from("<I", buf, start)[0]
+
+
+def read_metadata(content: bytes, name: str = METADATA_NAME):
+    """Bytes stored under `name` in the model's metadata table, or None. Pure Python, no TensorFlow."""
+    try:
+        model = struct.unpack_from("<I", content, 0)[0]
+        # Model table: 4 = buffers, 6 = metadata; Metadata: 0 = name, 1 = buffer; Buffer: 0 = data.
+        metadata_field = _table_field(content, model, 6)
+        buffers_field = _table_field(content, model, 4)
+        if metadata_field is None or buffers_field is None:
+            return None
+        entries, count = _vector(content, metadata_field)
+        for i in range(count):
+            entry = entries + 4 * i
+            entry += struct.unpack_from("<I", content, entry)[0]
+            name_field = _table_field(content, entry, 0)
+            if name_field is None:
+                continue
+            start, length = _vector(content, name_field)
+            if content[start:start + length].decode("utf-8") != name:
+                continue
+            buffer_field = _table_field(content, entry, 1)
+            index = struct.unpack_from("<I", content, buffer_field)[0] if buffer_field else 0
+            buffers, _ = _vector(content, buffers_field)
+            buffer = buffers + 4 * index
+            buffer += struct.unpack_from("<I", content, buffer)[0]
+            data_field = _table_field(content, buffer, 0)
+            if data_field is None:
+                return b""
+            start, length = _vector(content, data_field)
+            return bytes(content[start:start + length])
+    except (struct.error, UnicodeDecodeError):
+        return None
+    return None
+
+
+def read_json_metadata(content: bytes, name: str = METADATA_NAME) -> dict:
+    data = read_metadata(content, name)
+    try:
+        return json.loads(data.decode("utf-8")) if data else {}
+    except ValueError:
+        return {}
+
+
+def embed_metadata(content: bytes, metadata: dict, name: str = METADATA_NAME) -> bytes:
+    """Return the model with `metadata` (JSON) stored under `name`, replacing any previous entry."""
+    from tensorflow.lite.python import schema_py_generated as schema
+    from tensorflow.lite.tools import flatbuffer_utils
+
+    model = flatbuffer_utils.convert_bytearray_to_object(bytearray(content))
+    buffer = schema.BufferT()
+    buffer.data = bytearray(json.dumps(metadata).encode("utf-8"))
+    model.buffers.append(buffer)
+    entry = schema.MetadataT()
+    entry.name = name
+    entry.buffer = len(model.buffers) - 1
+    kept = [m for m in (model.metadata or []) if m.name.decode("utf-8") != name]
+    model.metadata = kept + [entry]
+    return bytes(flatbuffer_utils.convert_object_to_bytearray(model))
+
+
+# --- export ------------------------------------------------------------------
+
+def convert_dynamic(keras_model) -> bytes:
+    """Dynamic-range quantisation (int8 weights, float I/O): the previous export."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    return converter.convert()
+
+
+def convert_int8(keras_model, X_calibration: np.ndarray, windows: int = CALIBRATION_WINDOWS, seed: int = 0) -> bytes:
+    """Full-integer model with int8 input/output, calibrated on a sample of scaled training windows."""
+    import tensorflow as tf
+
+    rng = np.random.default_rng(seed)
+    sample = X_calibration[rng.choice(len(X_calibration), size=min(windows, len(X_calibration)), replace=False)]
+
+    def representative_dataset():
+        for window in sample:
+            yield [np.asarray(window[None], dtype=np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def benchmark(content: bytes, X: np.ndarray = None, y: np.ndarray = None, scale: float = 1.0,
+              repeat: int = LATENCY_REPEAT) -> dict:
+    """Size, single-window latency and (given scaled X, y) MAE in the original units."""
+    model = interpreter(model_content=content)
+    shape = tuple(model.get_input_details()[0]["shape"])
+    window = X[:1] if X is not None else np.random.default_rng(0).random((1,) + shape[1:], dtype=np.float32)
+    run(model, window)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(model, window)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    report = {
+        "bytes": len(content),
+        "input_dtype": np.dtype(model.get_input_details()[0]["dtype"]).name,
+        "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 4),
+                       "p95": round(float(np.percentile(latencies, 95)), 4)},
+    }
+    if X is not None and y is not None:
+        predictions = run(model, np.asarray(X, dtype=np.float32)).reshape(np.shape(y))
+        report["mae"] = round(float(np.abs(predictions - y).mean()) * scale, 4)
+    return report
+
+
+def export(keras_model, X_train: np.ndarray, X_val: np.ndarray, y_val: np.ndarray, metadata: dict,
+           tolerance: float = INT8_TOLERANCE) -> tuple:
+    """
+    Returns (tflite bytes, report). The int8 model is used unless its held-out MAE
+    exceeds the dynamic-range model's by more than `tolerance`; either way the
+    scaling in `metadata` is embedded and the report has both benchmarks.
+    """
+    scale = metadata["scale_max"] - metadata["scale_min"] or 1.0
+    dynamic = convert_dynamic(keras_model)
+    int8 = convert_int8(keras_model, X_train)
+    report = {
+        "dynamic": benchmark(dynamic, X_val, y_val, scale),
+        "int8": benchmark(int8, X_val, y_val, scale),
+        "tolerance": tolerance,
+    }
+    accepted = report["int8"]["mae"] <= report["dynamic"]["mae"] * (1 + tolerance)
+    report["quantization"] = "int8" if accepted else "dynamic"
+    content = int8 if accepted else dynamic
+    return embed_metadata(content, {**metadata, "quantization": report["quantization"]}), report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export and benchmark the TFLite temperature forecaster")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("export")
+    build.add_argument("--h5", default="models/prediction_model_temp.h5")
+    build.add_argument("--csv", default="hourly_interpolated_data.csv")
+    build.add_argument("--column", default="temperature_celsius")
+    build.add_argument("--out", default="models/temperature_model_pi.tflite")
+    build.add_argument("--tolerance", type=float, default=INT8_TOLERANCE)
+    bench = sub.add_parser("bench")
+    bench.add_argument("models", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        for path in args.models:
+            with open(path, "rb") as f:
+                content = f.read()
+            print(json.dumps({"model": path, **benchmark(content), "metadata": read_json_metadata(content)}))
+        return 0
+
+    import pandas as pd
+    import tensorflow as tf
+    from dataset import sliding_windows
+
+    temps = pd.read_csv(args.csv)[args.column].to_numpy(dtype=np.float32)
+    scale_min, scale_max = float(temps.min()), float(temps.max())
+    model = tf.keras.models.load_model(args.h5, compile=False)
+    lookback, forward = model.input_shape[1], model.output_shape[1]
+    X, y = sliding_windows((temps - scale_min) / ((scale_max - scale_min) or 1.0), lookback, forward)
+    split = int(0.8 * len(X))
+    metadata = {"scale_min": scale_min, "scale_max": scale_max, "units": "celsius",
+                "lookback": lookback, "forward": forward}
+    content, report = export(model, X[:split], X[split:], y[split:], metadata, args.tolerance)
+    with open(args.out, "wb") as f:
+        f.write(content)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
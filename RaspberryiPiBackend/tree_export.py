@@ -0,0 +1,235 @@
+"""
+Compact evaluator for the Mendalay XGBoost forecaster trained in temps.ipynb.
+
+The pickled sklearn MultiOutputRegressor (one XGBRegressor per output) is
+flattened once, offline, into packed NumPy arrays: per node the split
+feature, float32 threshold, left/right child, default direction for missing
+values and leaf value, plus each tree's root and output column. The
+StandardScaler parameters and window config ride along in the same .npz.
+TreeEnsemble walks every tree for every sample at once, one tree level per
+NumPy step, so serving needs neither xgboost nor sklearn.
+
+    python tree_export.py export --models ../models --out ../models/mendalay_forecast_5h_trees.npz
+    python tree_export.py check --models ../models --npz ../models/mendalay_forecast_5h_trees.npz --csv ../Mendalay.csv
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from dataset import sliding_windows, flatten_channels
+from ingest import load_series
+
+CHANNELS = ("temperature", "humidity")
+
+
+def _parse_base_score(value) -> float:
+    # Newer XGBoost writes a vector such as "[4.700365E-4]".
+    return float(str(value).strip("[]").split(",")[0])
+
+
+def _export_booster(booster) -> tuple:
+    model = json.loads(booster.save_raw("json"))
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "reg:squarederror":
+        raise ValueError(f"Unsupported objective {objective}; only identity-link regression is exported")
+    base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+    trees = []
+    for tree in learner["gradient_booster"]["model"]["trees"]:
+        left = np.asarray(tree["left_children"], dtype=np.int32)
+        trees.append({
+            "feature": np.asarray(tree["split_indices"], dtype=np.int32),
+            "threshold": np.asarray(tree["split_conditions"], dtype=np.float32),
+            "left": left,
+            "right": np.asarray(tree["right_children"], dtype=np.int32),
+            "default_left": np.asarray(tree["default_left"], dtype=bool),
+            "is_leaf": left == -1,
+        })
+    return base_score, trees
+
+
+def export_model(models_dir: str, out_path: str, prefix: str = "mendalay_forecast_5h") -> dict:
+    """Flatten the pickled forecaster into `out_path` (.npz). Needs xgboost and sklearn."""
+    import pickle
+
+    def load(name):
+        with open(os.path.join(models_dir, f"{prefix}_{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    model, scaler_X, scaler_y, config = load("model"), load("scaler_X"), load("scaler_y"), load("config")
+    boosters = [estimator.get_booster() for estimator in model.estimators_]
+    return export_boosters(boosters, scaler_X, scaler_y, config, out_path)
+
+
+def export_boosters(boosters: list, scaler_X, scaler_y, config: dict, out_path: str) -> dict:
+    """Pack one booster per output column, with the fitted StandardScalers and window config."""
+    feature, threshold, left, right, default_left, is_leaf = [], [], [], [], [], []
+    roots, tree_output, base_score = [], [], []
+    depth = 0
+    offset = 0
+    for output, booster in enumerate(boosters):
+        score, trees = _export_booster(booster)
+        base_score.append(score)
+        for tree in trees:
+            n = len(tree["feature"])
+            roots.append(offset)
+            tree_output.append(output)
+            feature.append(tree["feature"])
+            # For leaves XGBoost stores the leaf value in split_conditions.
+            threshold.append(tree["threshold"])
+            # Leaves point at themselves so a fixed number of steps is safe.
+            own = np.arange(offset, offset + n, dtype=np.int32)
+            left.append(np.where(tree["is_leaf"], own, tree["left"] + offset))
+            right.append(np.where(tree["is_leaf"], own, tree["right"] + offset))
+            default_left.append(tree["default_left"])
+            is_leaf.append(tree["is_leaf"])
+            depth = max(depth, _tree_depth(tree["left"], tree["right"]))
+            offset += n
+
+    arrays = {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "default_left": np.concatenate(default_left),
+        "is_leaf": np.concatenate(is_leaf),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "tree_output": np.asarray(tree_output, dtype=np.int32),
+        "base_score": np.asarray(base_score, dtype=np.float32),
+        "depth": np.int32(depth),
+        # Scaling stays float64 like sklearn; only the scaled features are cast to
+        # float32 (as XGBoost does), otherwise values next to a split can flip sides.
+        "x_mean": scaler_X.mean_.astype(np.float64),
+        "x_scale": scaler_X.scale_.astype(np.float64),
+        "y_mean": scaler_y.mean_.astype(np.float64),
+        "y_scale": scaler_y.scale_.astype(np.float64),
+        "n_past": np.int32(config["n_past"]),
+        "n_future": np.int32(config["n_future"]),
+    }
+    np.savez_compressed(out_path, **arrays)
+    return {"nodes": int(offset), "trees": len(roots), "outputs": len(base_score), "depth": depth,
+            "bytes": os.path.getsize(out_path)}
+
+
+def _tree_depth(left, right) -> int:
+    depth, frontier = 0, [0]
+    while frontier:
+        children = [c for node in frontier for c in (left[node], right[node]) if c != -1]
+        if not children:
+            break
+        depth += 1
+        frontier = children
+    return depth
+
+
+class TreeEnsemble:
+    """Vectorised evaluator over the packed arrays written by export_model()."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.version = "trees-" + hashlib.sha256(f.read()).hexdigest()[:8]
+        with np.load(path) as data:
+            for name in data.files:
+                setattr(self, name, data[name])
+        self.depth = int(self.depth)
+        self.n_past = int(self.n_past)
+        self.n_future = int(self.n_future)
+        # Leaf values live in `threshold` for leaf nodes.
+        self.leaf_value = np.where(self.is_leaf, self.threshold, 0.0).astype(np.float32)
+        # children[2 * node + go_right]: one flat gather per level.
+        self.children = np.stack([self.left, self.right], axis=1).ravel()
+        n_outputs = len(self.base_score)
+        self._assign = np.zeros((len(self.roots), n_outputs), dtype=np.float32)
+        self._assign[np.arange(len(self.roots)), self.tree_output] = 1.0
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        """(N, features) in the model's scaled space -> (N, outputs)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        row_offset = (np.arange(len(X), dtype=np.int64) * X.shape[1])[:, None]
+        has_nan = bool(np.isnan(flat).any())
+        node = np.broadcast_to(self.roots.astype(np.int64), (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            value = flat.take(row_offset + self.feature.take(node))
+            go_right = ~(value < self.threshold.take(node))
+            if has_nan:
+                go_right = np.where(np.isnan(value), ~self.default_left.take(node), go_right)
+            node = self.children.take(2 * node + go_right)
+        return self.leaf_value.take(node) @ self._assign + self.base_score
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Unscaled features (N, C * n_past) -> unscaled targets (N, C * n_future)."""
+        scaled = (np.asarray(X, dtype=np.float64) - self.x_mean) / self.x_scale
+        return self.predict_raw(scaled) * self.y_scale + self.y_mean
+
+    def step(self, windows: np.ndarray) -> np.ndarray:
+        """ForecastModel step: (B, n_past, C) -> (B, n_future, C)."""
+        predictions = self.predict(flatten_channels(np.asarray(windows, dtype=np.float32)))
+        return predictions.reshape(len(predictions), -1, self.n_future).transpose(0, 2, 1)
+
+
+def check(models_dir: str, npz_path: str, csv_path: str, samples: int = 2000, tolerance: float = 1e-3,
+          prefix: str = "mendalay_forecast_5h") -> int:
+    """Compare against the pickled model on Mendalay.csv windows and time both."""
+    import pickle
+
+    with open(os.path.join(models_dir, f"{prefix}_model.pkl"), "rb") as f:
+        model = pickle.load(f)
+    with open(os.path.join(models_dir, f"{prefix}_scaler_X.pkl"), "rb") as f:
+        scaler_X = pickle.load(f)
+    with open(os.path.join(models_dir, f"{prefix}_scaler_y.pkl"), "rb") as f:
+        scaler_y = pickle.load(f)
+    ensemble = TreeEnsemble(npz_path)
+
+    X, _ = sliding_windows(load_series(csv_path, CHANNELS, dtype=np.float64), ensemble.n_past, ensemble.n_future)
+    X = flatten_channels(X)[-samples:]
+
+    reference = scaler_y.inverse_transform(model.predict(scaler_X.transform(X)))
+    packed = ensemble.predict(X)
+    max_error = float(np.abs(reference - packed).max())
+
+    def timed(func, batch, repeat):
+        func(batch)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func(batch)
+        return (time.perf_counter() - started) / repeat * 1000.0
+
+    pickled = lambda batch: scaler_y.inverse_transform(model.predict(scaler_X.transform(batch)))
+    report = {
+        "samples": len(X),
+        "max_abs_error": max_error,
+        "tolerance": tolerance,
+        "single_ms": {"pickled": timed(pickled, X[:1], 50), "packed": timed(ensemble.predict, X[:1], 50)},
+        "batch_ms": {"pickled": timed(pickled, X, 5), "packed": timed(ensemble.predict, X, 5)},
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if max_error <= tolerance else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export and check the packed XGBoost forecaster")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export")
+    export.add_argument("--models", default="../models")
+    export.add_argument("--out", default="../models/mendalay_forecast_5h_trees.npz")
+    verify = sub.add_parser("check")
+    verify.add_argument("--models", default="../models")
+    verify.add_argument("--npz", default="../models/mendalay_forecast_5h_trees.npz")
+    verify.add_argument("--csv", default="../Mendalay.csv")
+    verify.add_argument("--samples", type=int, default=2000)
+    verify.add_argument("--tolerance", type=float, default=1e-3)
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        print(json.dumps(export_model(args.models, args.out)))
+        return 0
+    return check(args.models, args.npz, args.csv, args.samples, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
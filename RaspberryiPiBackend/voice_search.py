@@ -0,0 +1,84 @@
+"""
+Full-text search over voice interaction logs using SQLite FTS5.
+
+The voice LogWriter hands every flushed batch to VoiceSearchIndex.add_batch()
+on its writer thread, so indexing is one small transaction per batch and
+never runs inside a request handler. Queries match the user and assistant
+text and can be limited to a time range.
+"""
+import json
+import re
+import sqlite3
+import threading
+
+VOICE_SEARCH_DB = "voice_search.db"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def to_match_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must appear, as a prefix."""
+    tokens = _TOKEN.findall(text)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class VoiceSearchIndex:
+    def __init__(self, path: str = VOICE_SEARCH_DB) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS voice_fts "
+                "USING fts5(user, assistant, ts UNINDEXED, tokenize='porter unicode61')"
+            )
+
+    def latest_timestamp(self):
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(ts) FROM voice_fts").fetchone()
+        return row[0]
+
+    def add_batch(self, entries: list) -> None:
+        rows = [(e.get("user", ""), e.get("assistant", ""), e["timestamp"]) for e in entries]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO voice_fts(user, assistant, ts) VALUES (?, ?, ?)", rows)
+
+    def backfill(self, lines) -> int:
+        """Index raw JSON log lines (e.g. from LogWriter.iter_pages) in batches."""
+        batch, count = [], 0
+        for line in lines:
+            batch.append(json.loads(line))
+            if len(batch) == 500:
+                self.add_batch(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.add_batch(batch)
+            count += len(batch)
+        return count
+
+    def search(self, text: str, after: float = None, before: float = None,
+               limit: int = 20, offset: int = 0) -> list:
+        """Newest-first matches for `text`, optionally within after < ts < before."""
+        query = to_match_query(text)
+        if not query:
+            return []
+        sql = [
+            "SELECT ts, user, assistant, "
+            "snippet(voice_fts, -1, '[', ']', '...', 12) "
+            "FROM voice_fts WHERE voice_fts MATCH ?"
+        ]
+        params = [query]
+        if after is not None:
+            sql.append("AND ts > ?")
+            params.append(after)
+        if before is not None:
+            sql.append("AND ts < ?")
+            params.append(before)
+        sql.append("ORDER BY ts DESC LIMIT ? OFFSET ?")
+        params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        return [
+            {"timestamp": ts, "user": user, "assistant": assistant, "snippet": snippet}
+            for ts, user, assistant, snippet in rows
+        ]
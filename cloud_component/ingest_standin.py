@@ -0,0 +1,154 @@
+"""
+Local HTTP ingestion stand-in for sizing the telemetry path without Azure.
+
+Accepts POST /telemetry with a JSON body carrying device_id, seq and sent_at,
+and records throughput, end-to-end latency percentiles and dropped messages
+(gaps in each device's sequence numbers). GET /stats returns the counters.
+
+    python ingest_standin.py --port 8080
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+# Latency samples kept for the whole-run summary printed on exit.
+RESERVOIR_SIZE = 10000
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class IngestStats:
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.messages = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.latencies = []
+        # Uniform sample of every latency since start; `latencies` is reset per report.
+        self.reservoir = []
+        self._seen = 0
+        self._rng = random.Random(0)
+        self._last_seq = {}
+
+    def record(self, body: dict, size: int, received: float) -> None:
+        self.messages += 1
+        self.bytes += size
+        latency = received - body["sent_at"]
+        self.latencies.append(latency)
+        self._seen += 1
+        if len(self.reservoir) < RESERVOIR_SIZE:
+            self.reservoir.append(latency)
+        else:
+            slot = self._rng.randrange(self._seen)
+            if slot < RESERVOIR_SIZE:
+                self.reservoir[slot] = latency
+        device, seq = body["device_id"], body["seq"]
+        last = self._last_seq.get(device)
+        if last is not None and seq > last + 1:
+            self.dropped += seq - last - 1
+        self._last_seq[device] = max(seq, last if last is not None else seq)
+
+    def snapshot(self, reset_latencies: bool = False, cumulative: bool = False) -> dict:
+        """Counters since start; latency percentiles since the last reset, or over the whole run if cumulative."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        ms = [v * 1000.0 for v in (self.reservoir if cumulative else self.latencies)]
+        report = {
+            "devices": len(self._last_seq),
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "msgs_per_sec": round(self.messages / elapsed, 2),
+            "bytes_per_sec": round(self.bytes / elapsed, 2),
+            "latency_ms": {f"p{p}": percentile(ms, p) for p in (50, 95, 99)},
+        }
+        if reset_latencies:
+            self.latencies = []
+        return report
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, body
+
+
+def _response(status: str, body: bytes) -> bytes:
+    head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode("latin-1") + body
+
+
+def make_handler(stats: IngestStats):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                if method == "POST" and path == "/telemetry":
+                    try:
+                        stats.record(json.loads(body), len(body), time.time())
+                        writer.write(_response("200 OK", b'{"ok":true}'))
+                    except (ValueError, KeyError):
+                        stats.rejected += 1
+                        writer.write(_response("400 Bad Request", b'{"ok":false}'))
+                elif method == "GET" and path == "/stats":
+                    writer.write(_response("200 OK", json.dumps(stats.snapshot()).encode()))
+                else:
+                    writer.write(_response("404 Not Found", b"{}"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(host: str, port: int, report_every: float, stats: IngestStats = None):
+    stats = stats or IngestStats()
+    server = await asyncio.start_server(make_handler(stats), host, port)
+    print(f"Ingestion stand-in listening on http://{host}:{port}")
+    async with server:
+        while True:
+            await asyncio.sleep(report_every)
+            print(json.dumps(stats.snapshot(reset_latencies=True)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local telemetry ingestion stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--report-every", type=float, default=10.0)
+    args = parser.parse_args()
+    stats = IngestStats()
+    try:
+        asyncio.run(serve(args.host, args.port, args.report_every, stats))
+    except KeyboardInterrupt:
+        print(json.dumps(stats.snapshot(cumulative=True)))
+        print("Ingestion stand-in stopped.")
+
+
+if __name__ == "__main__":
+    main()
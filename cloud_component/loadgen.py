@@ -0,0 +1,146 @@
+"""
+Multi-device telemetry load generator.
+
+Simulates N devices concurrently on one asyncio loop. Each device replays the
+hourly temperature/humidity pattern from Mendalay.csv from its own random
+offset (with a small per-device bias), at a configurable message rate and
+payload size, against the local ingestion stand-in.
+
+    python ingest_standin.py --port 8080 &
+    python loadgen.py --devices 300 --rate 0.2 --payload-bytes 512 --duration 120
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+
+from ingest_standin import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_profile(csv_path: str) -> list:
+    """Return [(temperature, humidity), ...] from a Mendalay-style CSV."""
+    profile = []
+    with open(csv_path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        temp_col = next(i for i, name in enumerate(header) if name.startswith("Temperature"))
+        hum_col = next(i for i, name in enumerate(header) if "Humidity" in name)
+        for row in reader:
+            try:
+                profile.append((float(row[temp_col]), float(row[hum_col])))
+            except (ValueError, IndexError):
+                continue
+    if not profile:
+        raise ValueError(f"No temperature/humidity rows in {csv_path}")
+    return profile
+
+
+class DeviceStats:
+    def __init__(self) -> None:
+        self.sent = 0
+        self.failed = 0
+        self.bytes = 0
+        self.latencies = []
+
+
+async def run_device(index: int, profile: list, args, stats: DeviceStats) -> None:
+    rng = random.Random(index)
+    device_id = f"sim-{index:04d}"
+    position = rng.randrange(len(profile))
+    bias = rng.uniform(-1.5, 1.5)
+    interval = 1.0 / args.rate
+    # Spread the first messages so devices don't all fire in lock-step.
+    await asyncio.sleep(rng.uniform(0, interval))
+    deadline = time.monotonic() + args.duration
+    reader = writer = None
+    seq = 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        temp, hum = profile[position % len(profile)]
+        position += 1
+        body = {
+            "device_id": device_id,
+            "seq": seq,
+            "sent_at": time.time(),
+            "Temperature": round(temp + bias + rng.gauss(0, 0.1), 2),
+            "Humidity": round(hum + rng.gauss(0, 0.5), 2),
+            "Motion": rng.random() < 0.05,
+        }
+        payload = json.dumps(body, separators=(",", ":")).encode()
+        pad = args.payload_bytes - len(payload) - len(',"pad":""')
+        if pad > 0:
+            body["pad"] = "x" * pad
+            payload = json.dumps(body, separators=(",", ":")).encode()
+        request = (
+            f"POST /telemetry HTTP/1.1\r\nHost: {args.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+        ).encode("latin-1") + payload
+        seq += 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(args.host, args.port)
+            writer.write(request)
+            await writer.drain()
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if not status.startswith(b"HTTP/1.1 200"):
+                raise ConnectionError(status.decode("latin-1").strip())
+            stats.sent += 1
+            stats.bytes += len(payload)
+            stats.latencies.append(time.monotonic() - started)
+        except (OSError, asyncio.IncompleteReadError):
+            stats.failed += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    if writer is not None:
+        writer.close()
+
+
+async def run(args) -> dict:
+    profile = load_profile(args.csv)
+    stats = [DeviceStats() for _ in range(args.devices)]
+    started = time.monotonic()
+    await asyncio.gather(*(run_device(i, profile, args, stats[i]) for i in range(args.devices)))
+    elapsed = time.monotonic() - started
+    latencies = [v * 1000.0 for s in stats for v in s.latencies]
+    sent = sum(s.sent for s in stats)
+    return {
+        "devices": args.devices,
+        "duration_s": round(elapsed, 2),
+        "sent": sent,
+        "failed": sum(s.failed for s in stats),
+        "msgs_per_sec": round(sent / elapsed, 2),
+        "bytes_per_msg": round(sum(s.bytes for s in stats) / max(sent, 1), 1),
+        "round_trip_ms": {f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many SmartAura devices sending telemetry")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=0.2, help="messages per second per device")
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--csv", default=os.path.join(HERE, "..", "Mendalay.csv"))
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()